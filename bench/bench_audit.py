@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+审计日志查询耗时：约一年的识别记录，按用户和时间范围查询
+
+python bench/bench_audit.py [records]
+"""
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(".")
+from fm22x.audit import AuditKind, AuditLog
+from fm22x.response import MID
+
+YEAR = 365 * 86400
+USERS = 2000
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        with AuditLog(tmp, segment_records=1 << 16) as log:
+            start = time.perf_counter()
+            step = YEAR / records
+            for i in range(records):
+                log.append(
+                    AuditKind.VERIFY, rng.randrange(USERS), MID.MID_VERIFY, 0, 1, i * step
+                )
+            print(f"append  {records / (time.perf_counter() - start):10.0f} records/s")
+
+        with AuditLog(tmp, segment_records=1 << 16) as log:
+            for name, kwargs in (
+                ("user, whole year", {"user_id": 7}),
+                ("user, one month", {"user_id": 7, "start": 0.5 * YEAR, "end": 0.5 * YEAR + 30 * 86400}),
+                ("all users, one day", {"start": 0.25 * YEAR, "end": 0.25 * YEAR + 86400}),
+            ):
+                start = time.perf_counter()
+                found = log.query(**kwargs)
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"{name:20s} {len(found):6d} records {elapsed:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
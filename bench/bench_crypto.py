@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+加密模式对收发帧率的影响
+
+python bench/bench_crypto.py
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+sys.path.append(".")
+from fm22x.connection import Connection
+from fm22x.crypto import XorCipher
+from fm22x.request import GetUserInfo
+from fm22x.sim import encode_frame
+
+KEY = b"0123456789abcdef"
+PAYLOAD = b"\x22\x00\x00\x07" + b"user".ljust(32, b"\x00") + b"\x01"
+FRAMES = 20000
+
+
+def make_stream(cipher: XorCipher | None) -> bytes:
+    if cipher is None:
+        return encode_frame(0x00, PAYLOAD) * FRAMES
+    stream = bytearray()
+    for _ in range(FRAMES):
+        buf = bytearray(PAYLOAD)
+        cipher.encrypt_into(memoryview(buf))  # 每帧的密钥流不同
+        stream += encode_frame(0x00, buf)
+    return bytes(stream)
+
+
+def bench_receive(cipher: XorCipher | None) -> float:
+    stream = make_stream(XorCipher(KEY, host=False) if cipher else None)
+    con = Connection(cipher)
+    start = time.perf_counter()
+    for _ in con.receive(stream):
+        pass
+    return FRAMES / (time.perf_counter() - start)
+
+
+def bench_send(cipher: XorCipher | None) -> float:
+    con = Connection(cipher)
+    req = GetUserInfo(7)
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        con.send(req)
+    return FRAMES / (time.perf_counter() - start)
+
+
+def main():
+    for name, func in (("receive", bench_receive), ("send", bench_send)):
+        plain = func(None)
+        enc = func(XorCipher(KEY))
+        print(
+            f"{name:8s} plain {plain:10.0f} frames/s  "
+            f"encrypted {enc:10.0f} frames/s  overhead {(plain / enc - 1) * 100:5.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+每帧路由开销：receive + isinstance 链 与 Dispatcher.feed 对比
+
+python bench/bench_dispatch.py
+"""
+import sys
+import time
+
+sys.path.append(".")
+from fm22x.connection import Connection
+from fm22x.dispatch import Dispatcher
+from fm22x.note import NidEyeState, NidFaceState, NidOTADone, NidReady, NidUnknownError
+from fm22x.response import (
+    MidDelUser,
+    MidEnroll,
+    MidGetStatus,
+    MidGetUserInfo,
+    MidReset,
+    MidVerify,
+    MsgResultCode,
+)
+from fm22x.sim import encode_frame
+
+FACE = encode_frame(0x01, bytes.fromhex("01 0000 0064 0064 00c8 00c8 0000 0000 0000"))
+VERIFY = encode_frame(0x00, bytes((0x12, 0)) + b"\x00\x01" + bytes(32) + b"\x00\x01")
+STATUS = encode_frame(0x00, bytes.fromhex("11 00 00"))
+# NidFaceState 洪泛中夹杂少量 reply
+STREAM = (FACE * 18 + VERIFY + STATUS) * 5000
+FRAMES = 20 * 5000
+CHUNK = 4096
+
+
+def chain(faces: bool) -> float:
+    con = Connection()
+    seen = []
+    start = time.perf_counter()
+    for pos in range(0, len(STREAM), CHUNK):
+        for ev in con.receive(STREAM[pos : pos + CHUNK]):
+            if isinstance(ev, (MidReset, MidDelUser, MidEnroll, MidGetUserInfo)):
+                pass
+            elif isinstance(ev, (NidReady, NidUnknownError, NidOTADone, NidEyeState)):
+                pass
+            elif isinstance(ev, MidVerify):
+                if ev.result == MsgResultCode.SUCCESS:
+                    seen.append(ev)
+            elif isinstance(ev, MidGetStatus):
+                seen.append(ev)
+            elif faces and isinstance(ev, NidFaceState):
+                seen.append(ev)
+    return time.perf_counter() - start
+
+
+def dispatcher(faces: bool) -> float:
+    con = Connection()
+    seen = []
+    d = Dispatcher()
+    d.subscribe(MidVerify, seen.append, MsgResultCode.SUCCESS)
+    d.subscribe(MidGetStatus, seen.append)
+    if faces:
+        d.subscribe(NidFaceState, seen.append)
+    start = time.perf_counter()
+    for pos in range(0, len(STREAM), CHUNK):
+        d.feed(con, STREAM[pos : pos + CHUNK])
+    return time.perf_counter() - start
+
+
+def main():
+    for faces in (False, True):
+        label = "faces subscribed" if faces else "replies only"
+        a = min(chain(faces) for _ in range(3))
+        b = min(dispatcher(faces) for _ in range(3))
+        print(
+            f"{label:17s} isinstance {a / FRAMES * 1e6:.2f} us/frame  "
+            f"dispatcher {b / FRAMES * 1e6:.2f} us/frame  x{a / b:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
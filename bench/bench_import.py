@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+导入耗时基准，超出 import_budget.json 中的预算时返回非零
+
+python bench/bench_import.py [--runs 31] [--record bench/import_history.csv]
+
+预算单位为微秒：每次在新的解释器中用 time.perf_counter 计时一条导入语句，取多次的中位数。
+第一次运行用于生成字节码缓存，不计入结果。
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = os.path.join(ROOT, "bench", "import_budget.json")
+
+CASES = ("import fm22x", "from fm22x import Connection")
+
+
+_TIMED = """\
+import time
+start = time.perf_counter()
+{stmt}
+print((time.perf_counter() - start) * 1e6)
+"""
+
+
+def measure(stmt: str) -> float:
+    """
+    在新的解释器中执行 stmt 的耗时（微秒）
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    out = subprocess.run(
+        [sys.executable, "-c", _TIMED.format(stmt=stmt)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(out)
+
+
+def median_of(stmt: str, runs: int) -> float:
+    measure(stmt)
+    return statistics.median(measure(stmt) for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=31)
+    parser.add_argument("--record", help="把结果追加到 csv 以便长期跟踪")
+    args = parser.parse_args()
+
+    with open(BUDGET, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+
+    failed = False
+    results = {}
+    for stmt in CASES:
+        us = median_of(stmt, args.runs)
+        results[stmt] = us
+        limit = budget.get(stmt)
+        ok = limit is None or us <= limit
+        failed |= not ok
+        print(f"{stmt:32s} {us:8.0f} us  budget {limit} us  {'ok' if ok else 'OVER'}")
+
+    if args.record:
+        new = not os.path.exists(args.record)
+        with open(args.record, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(["time", "python", "machine", *results])
+            writer.writerow(
+                [
+                    time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    platform.python_version(),
+                    platform.machine(),
+                    *results.values(),
+                ]
+            )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
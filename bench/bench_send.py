@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+逐帧发送与 send_many 批量发送对比
+
+python bench/bench_send.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(".")
+from fm22x.connection import Connection
+from fm22x.request import DeleteUser
+
+BATCH = 500
+ROUNDS = 200
+
+
+def per_frame(con: Connection, fd: int, reqs: list) -> None:
+    for req in reqs:
+        os.write(fd, con.send(req))
+
+
+def batched(con: Connection, fd: int, reqs: list) -> None:
+    os.write(fd, con.send_many(reqs))
+
+
+def vectored(con: Connection, fd: int, reqs: list) -> None:
+    views = con.send_many(reqs, vectored=True)
+    iov_max = os.sysconf("SC_IOV_MAX")
+    for i in range(0, len(views), iov_max):
+        os.writev(fd, views[i : i + iov_max])
+
+
+def main():
+    reqs = [DeleteUser(i) for i in range(BATCH)]
+    fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        for func in (per_frame, batched, vectored):
+            con = Connection()
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                func(con, fd, reqs)
+            elapsed = time.perf_counter() - start
+            print(f"{func.__name__:10s} {BATCH * ROUNDS / elapsed:10.0f} frames/s")
+    finally:
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+共享内存事件总线与 pickle + socketpair 转发的扇出延迟和读取端 CPU 对比
+
+python bench/bench_shm.py
+"""
+import multiprocessing
+import pickle
+import socket
+import sys
+import time
+
+sys.path.append(".")
+from fm22x.metrics import LatencyHistogram
+from fm22x.note import FaceInfo, encode_face
+from fm22x.shm import EventBus, EventBusReader
+
+FRAMES = 20000
+RATE = 5000  # frames/s，远高于串口实际帧率
+FACE = b"\x01" + encode_face(FaceInfo(0, 10, 20, 110, 120, -3, 2, 1))
+
+
+def shm_reader(name: str, queue) -> None:
+    hist = LatencyHistogram()
+    seen = 0
+    cpu = time.process_time()
+    with EventBusReader(name) as reader:
+        while seen < FRAMES:
+            now = time.time()
+            got = 0
+            for _, ts, _, _, view in reader.poll_raw():
+                hist.record(now - ts)
+                view.release()
+                got += 1
+            if not got:
+                reader.wait(1.0)
+            seen += got
+        queue.put((hist.summary(), time.process_time() - cpu, reader.dropped))
+
+
+def socket_reader(sock: socket.socket, queue) -> None:
+    hist = LatencyHistogram()
+    cpu = time.process_time()
+    f = sock.makefile("rb")
+    for _ in range(FRAMES):
+        ts, _ = pickle.load(f)
+        hist.record(time.time() - ts)
+    queue.put((hist.summary(), time.process_time() - cpu, 0))
+
+
+def paced(publish) -> None:
+    start = time.perf_counter()
+    for i in range(FRAMES):
+        while time.perf_counter() - start < i / RATE:
+            pass
+        publish()
+
+
+def report(name: str, queue) -> None:
+    summary, cpu, dropped = queue.get()
+    print(f"{name:7s} {summary}  reader cpu {cpu:.2f}s  dropped {dropped}")
+
+
+def main():
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+
+    with EventBus(capacity=4096) as bus:
+        proc = ctx.Process(target=shm_reader, args=(bus.name, queue))
+        proc.start()
+        time.sleep(1)
+        paced(lambda: bus.publish(0x01, FACE))
+        report("shm", queue)
+        proc.join()
+
+    parent, child = socket.socketpair()
+    proc = ctx.Process(target=socket_reader, args=(child, queue))
+    proc.start()
+    time.sleep(1)
+    f = parent.makefile("wb")
+
+    def publish():
+        pickle.dump((time.time(), FACE), f)
+        f.flush()
+
+    paced(publish)
+    report("socket", queue)
+    proc.join()
+
+
+if __name__ == "__main__":
+    main()
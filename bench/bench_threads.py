@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+ThreadSafeConnection 多线程构造事件的吞吐，free-threaded 构建下应随线程数增长
+
+python bench/bench_threads.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.append(".")
+from fm22x.note import NidFaceState
+from fm22x.sim import encode_frame
+from fm22x.threadsafe import ThreadSafeConnection
+
+FRAMES = 100000
+FACE = encode_frame(0x01, bytes.fromhex("01 0000 0064 0064 00c8 00c8 0000 0000 0000"))
+STATUS = encode_frame(0x00, bytes.fromhex("11 00 00"))
+STREAM = (FACE * 9 + STATUS) * (FRAMES // 10)
+CHUNK = 4096
+
+
+def run(workers: int) -> float:
+    """
+    一个线程 feed，workers 个线程取事件并读取字段
+    :return: frames/s
+    """
+    con = ThreadSafeConnection()
+    done = threading.Event()
+
+    def reader():
+        for pos in range(0, len(STREAM), CHUNK):
+            con.feed(STREAM[pos : pos + CHUNK])
+        done.set()
+
+    def worker():
+        while not (done.is_set() and not con.frames):
+            for ev in con.events(timeout=0.001):
+                if isinstance(ev, NidFaceState):
+                    ev.state, ev.left, ev.top  # 模拟使用者读取字段
+
+    threads = [threading.Thread(target=reader)]
+    threads += [threading.Thread(target=worker) for _ in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return FRAMES / (time.perf_counter() - start)
+
+
+def main():
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(
+        f"python {sys.version.split()[0]}  gil {'on' if gil else 'off'}  "
+        f"cpus {os.cpu_count()}"
+    )
+    base = None
+    for workers in (1, 2, 4, 8):
+        rate = max(run(workers) for _ in range(3))
+        base = base or rate
+        print(f"{workers} workers {rate:10.0f} frames/s  x{rate / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
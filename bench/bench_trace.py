@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+开启 Tracer 后的额外开销，超出预算时返回非零
+
+python bench/bench_trace.py
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+sys.path.append(".")
+from fm22x.connection import Connection
+from fm22x.request import GetUserInfo
+from fm22x.sim import encode_frame
+from fm22x.trace import Tracer
+
+# 每个事务（发送 + 接收 + 解码）的额外耗时上限（秒）
+# 115200 波特率下一个最短的事务也要数毫秒，10us 不到其 1%
+BUDGET = 10e-6
+ROUNDS = 20000
+PAYLOAD = b"\x22\x00\x00\x07" + b"user".ljust(32, b"\x00") + b"\x01"
+REPLY = encode_frame(0x00, PAYLOAD)
+
+
+def run(tracer: Tracer | None) -> float:
+    con = Connection()
+    con.tracer = tracer
+    req = GetUserInfo(7)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        con.send(req)
+        for _ in con.receive(REPLY):
+            pass
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    plain = traced = float("inf")
+    for _ in range(5):  # 交替运行取最小值，减少噪声
+        plain = min(plain, run(None))
+        traced = min(traced, run(Tracer()))
+    overhead = traced - plain
+    print(
+        f"plain {plain * 1e6:.2f} us/txn  traced {traced * 1e6:.2f} us/txn  "
+        f"overhead {overhead * 1e6:.2f} us ({overhead / plain * 100:.0f}%, "
+        f"budget {BUDGET * 1e6:.0f} us)"
+    )
+    sys.exit(0 if overhead <= BUDGET else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+长时间压力测试：在伪终端上运行多个模拟模组，主机端用 asyncio 按流量配置并发收发，
+定期输出吞吐、延迟分位数、内存增长和解析错误率，超出阈值时返回非零
+
+python bench/soak.py --devices 8 --profile noisy --duration 3600 --interval 60
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import selectors
+import sys
+import time
+import tty
+from typing import NamedTuple
+
+sys.path.append(".")
+from fm22x.connection import Connection
+from fm22x.metrics import LatencyHistogram
+from fm22x.request import DeleteUser, GetStatus, GetUserInfo, Request, Verify
+from fm22x.response import Response
+from fm22x.sim import VirtualDevice
+
+
+class Profile(NamedTuple):
+    mix: dict  # 请求 -> 权重
+    face_notes: int  # 每次 Verify 前的 NidFaceState 数量
+    fail_rate: float
+    noise: float
+    corrupt: float
+
+
+_MIX = {"verify": 1, "status": 4, "user_info": 2}
+PROFILES = {
+    "steady": Profile(_MIX, 3, 0.1, 0.0, 0.0),
+    "flood": Profile({"verify": 1}, 200, 0.1, 0.0, 0.0),
+    "noisy": Profile(dict(_MIX, delete=1), 3, 0.1, 0.05, 0.01),
+}
+USERS = {i: f"user{i}" for i in range(1, 101)}
+
+
+def make_request(kind: str, rnd: random.Random) -> Request:
+    if kind == "verify":
+        return Verify(False, 5)
+    if kind == "status":
+        return GetStatus()
+    if kind == "user_info":
+        return GetUserInfo(rnd.randint(1, 120))
+    return DeleteUser(rnd.randint(1, 120))
+
+
+def serve(profile: str, devices: int, names, stop) -> None:
+    """
+    模组进程：每个模组一个伪终端，主机端按名称打开从设备
+    """
+    p = PROFILES[profile]
+    sel = selectors.DefaultSelector()
+    for i in range(devices):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        dev = VirtualDevice(USERS, p.face_notes, p.fail_rate, p.noise, p.corrupt, i)
+        sel.register(master, selectors.EVENT_READ, (dev, slave))
+        names.put(os.ttyname(slave))
+    while not stop.is_set():
+        for key, _ in sel.select(0.1):
+            dev, _ = key.data
+            try:
+                data = os.read(key.fd, 65536)
+            except BlockingIOError:
+                continue
+            out = memoryview(dev.feed(data))
+            while out:
+                try:
+                    out = out[os.write(key.fd, out) :]
+                except BlockingIOError:
+                    time.sleep(0.001)
+
+
+class Stats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.transactions = 0
+        self.frames = 0
+        self.bytes = 0
+        self.parser_errors = 0
+        self.timeouts = 0
+        self.latency = LatencyHistogram()
+
+    def merge(self, other: "Stats") -> None:
+        self.transactions += other.transactions
+        self.frames += other.frames
+        self.bytes += other.bytes
+        self.parser_errors += other.parser_errors
+        self.timeouts += other.timeouts
+        self.latency.merge(other.latency)
+
+
+class PtyClient:
+    """
+    fm22x.type.Transport 的伪终端实现
+    """
+
+    def __init__(self, path: str, stats: Stats, timeout: float):
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self.fd)
+        self.con = Connection()
+        self.stats = stats
+        self.timeout = timeout
+        self._waiter: asyncio.Future | None = None
+        self._command = None
+        asyncio.get_running_loop().add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        stats = self.stats
+        stats.bytes += len(data)
+        while True:
+            try:
+                for ev in self.con.receive(data):
+                    stats.frames += 1
+                    waiter = self._waiter
+                    if (
+                        isinstance(ev, Response)
+                        and ev.mid == self._command  # 超时后迟到的回复不算
+                        and waiter
+                        and not waiter.done()
+                    ):
+                        waiter.set_result(ev)
+                break
+            except ValueError:
+                stats.parser_errors += 1
+                self.con.resync()
+                data = b""
+
+    async def call(self, req: Request) -> Response | None:
+        self._waiter = asyncio.get_running_loop().create_future()
+        self._command = req.command
+        start = time.perf_counter()
+        os.write(self.fd, self.con.send(req))
+        try:
+            resp = await asyncio.wait_for(self._waiter, self.timeout)
+        except asyncio.TimeoutError:
+            # 帧头损坏时长度字段可能很大，丢掉半帧重新找同步字
+            self.stats.timeouts += 1
+            self.con.cancel(req)
+            if self.con.buffer:
+                self.con.resync()
+            return None
+        self.stats.latency.record(time.perf_counter() - start)
+        self.stats.transactions += 1
+        return resp
+
+    def close(self) -> None:
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+
+def memory() -> int:
+    """
+    当前常驻内存（字节）
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def client(path: str, args, stats: Stats, until: float, seed: int):
+    profile = PROFILES[args.profile]
+    rnd = random.Random(seed)
+    kinds = list(profile.mix)
+    weights = list(profile.mix.values())
+    transport = PtyClient(path, stats, args.timeout)
+    try:
+        while time.monotonic() < until:
+            await transport.call(make_request(rnd.choices(kinds, weights)[0], rnd))
+    finally:
+        transport.close()
+
+
+async def run(args, paths: list) -> list:
+    start = time.monotonic()
+    until = start + args.duration
+    interval = Stats()
+    total = Stats()
+    tasks = [
+        asyncio.create_task(client(path, args, interval, until, i))
+        for i, path in enumerate(paths)
+    ]
+    rows = []
+    last = start
+    while tasks:
+        done, _ = await asyncio.wait(tasks, timeout=args.interval)
+        tasks = [t for t in tasks if t not in done]
+        for t in done:
+            t.result()
+        now = time.monotonic()
+        elapsed = now - last
+        last = now
+        row = {
+            "t": now - start,
+            # 结束时等待最后几个请求的区间
+            "partial": elapsed < args.interval / 2,
+            "tps": interval.transactions / elapsed,
+            "fps": interval.frames / elapsed,
+            "p50": interval.latency.p50,
+            "p99": interval.latency.p99,
+            "rss": memory(),
+            "errors_per_mb": interval.parser_errors / max(interval.bytes, 1) * 1e6,
+            "timeout_rate": interval.timeouts
+            / max(interval.transactions + interval.timeouts, 1),
+        }
+        rows.append(row)
+        print(
+            f"t={row['t']:7.1f}s {row['tps']:8.0f} txn/s {row['fps']:8.0f} frames/s "
+            f"p50={row['p50'] * 1e3:.2f}ms p99={row['p99'] * 1e3:.2f}ms "
+            f"rss={row['rss'] / 2**20:.1f}MB parser_errors/MB={row['errors_per_mb']:.1f} "
+            f"timeouts={row['timeout_rate'] * 100:.2f}%",
+            flush=True,
+        )
+        total.merge(interval)
+        interval.reset()
+    print(
+        f"total {total.transactions} txn, {total.frames} frames, "
+        f"{total.parser_errors} parser errors, {total.timeouts} timeouts, "
+        f"latency {total.latency.summary()}"
+    )
+    return rows
+
+
+def check(args, rows: list) -> list:
+    """
+    :return: 超出阈值的项
+    """
+    full = [row for row in rows if not row["partial"]] or rows
+    failures = []
+    tps = min(row["tps"] for row in full)
+    if tps < args.min_tps:
+        failures.append(f"throughput {tps:.0f} txn/s < {args.min_tps}")
+    p99 = max(row["p99"] for row in full) * 1e3
+    if p99 > args.max_p99:
+        failures.append(f"p99 {p99:.2f}ms > {args.max_p99}ms")
+    # 以第一个区间结束时为基线，排除预热时的分配
+    growth = (rows[-1]["rss"] - rows[0]["rss"]) / 2**20
+    if growth > args.max_rss_growth:
+        failures.append(f"rss growth {growth:.1f}MB > {args.max_rss_growth}MB")
+    timeouts = max(row["timeout_rate"] for row in full) * 100
+    if timeouts > args.max_timeouts:
+        failures.append(f"timeouts {timeouts:.2f}% > {args.max_timeouts}%")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="steady")
+    parser.add_argument("--duration", type=float, default=30.0, help="秒")
+    parser.add_argument("--interval", type=float, default=5.0, help="报告间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=0.5, help="请求超时（秒）")
+    parser.add_argument("--min-tps", type=float, default=100.0)
+    parser.add_argument("--max-p99", type=float, default=50.0, help="毫秒")
+    parser.add_argument("--max-rss-growth", type=float, default=16.0, help="MB")
+    parser.add_argument("--max-timeouts", type=float, default=5.0, help="%%")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    names = ctx.Queue()
+    stop = ctx.Event()
+    proc = ctx.Process(target=serve, args=(args.profile, args.devices, names, stop))
+    proc.start()
+    try:
+        paths = [names.get(timeout=30) for _ in range(args.devices)]
+        rows = asyncio.run(run(args, paths))
+    finally:
+        stop.set()
+        proc.join()
+    failures = check(args, rows)
+    for failure in failures:
+        print("FAIL", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,56 @@
 # -*- coding: utf-8 -*-
-from fm22x.connection import Connection
+"""
+子模块按需加载：import fm22x 本身不会导入任何消息定义
+"""
+import importlib
+
+TYPE_CHECKING = False  # 避免为了类型检查导入 typing
+
+if TYPE_CHECKING:
+    from fm22x.connection import Connection
+    from fm22x.threadsafe import ThreadSafeConnection
 
 __version__ = "0.0.1"
+
+_lazy_attrs = {
+    "Connection": "fm22x.connection",
+    "ThreadSafeConnection": "fm22x.threadsafe",
+}
+_submodules = (
+    "audit",
+    "connection",
+    "crypto",
+    "dispatch",
+    "enroll",
+    "export",
+    "metrics",
+    "note",
+    "photo",
+    "request",
+    "response",
+    "shm",
+    "sim",
+    "sync",
+    "threadsafe",
+    "trace",
+    "tracker",
+    "type",
+    "verify",
+)
+
+__all__ = ["Connection", "ThreadSafeConnection"]
+
+
+def __getattr__(name: str):
+    if name in _lazy_attrs:
+        value = getattr(importlib.import_module(_lazy_attrs[name]), name)
+    elif name in _submodules:
+        value = importlib.import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attrs) | set(_submodules))
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+识别/录入/删除的只追加审计日志
+
+每条记录 16 字节，按写入顺序追加到分段文件 NNNNNNNN.seg；
+分段写满后生成 NNNNNNNN.idx，内容是按 (user_id, 记录号) 排序的索引。
+按时间查询直接在分段上二分，按用户查询在索引上二分。
+时间戳不递增（例如系统时钟回拨）的分段按顺序扫描，封存时另存 NNNNNNNN.rng 记录其时间范围。
+"""
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+import time
+from enum import IntEnum
+from typing import Callable, NamedTuple
+
+from fm22x.note import Note
+from fm22x.request import Command
+from fm22x.response import (
+    MidDelUser,
+    MidEnroll,
+    MidEnrollITG,
+    MidEnrollSingle,
+    MidEnrollWithPhoto,
+    MidVerify,
+    MsgResultCode,
+    Response,
+)
+
+_RECORD = struct.Struct("<dHBBBB2x")  # ts, user_id, kind, mid, result, extra
+_INDEX = struct.Struct("<HI")  # user_id, 记录号
+_RANGE = struct.Struct("<dd")  # 乱序分段的最早、最晚时间戳
+
+NO_USER = 0xFFFF  # 失败的识别等没有用户ID的记录
+
+
+class AuditKind(IntEnum):
+    VERIFY = 1
+    ENROLL = 2
+    DELETE = 3
+
+
+class AuditRecord(NamedTuple):
+    timestamp: float
+    user_id: int
+    kind: AuditKind
+    mid: int
+    result: MsgResultCode
+    extra: int  # 识别为 unlock_status，录入为 face_direction
+
+
+def _bisect(n: int, key: Callable[[int], float | tuple], target) -> int:
+    """
+    返回第一个 key(i) >= target 的 i
+    """
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key(mid) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class _Segment:
+    def __init__(self, directory: str, number: int):
+        self.number = number
+        self.path = os.path.join(directory, f"{number:08d}.seg")
+        self.index_path = os.path.join(directory, f"{number:08d}.idx")
+        self.range_path = os.path.join(directory, f"{number:08d}.rng")
+        self.sealed = os.path.exists(self.index_path)
+        self.count = 0
+        self.first = math.inf  # 最早的时间戳
+        self.last = -math.inf  # 最晚的时间戳
+        self.ordered = True  # 时间戳是否不递减，否则查询时按顺序扫描
+        self._map: mmap.mmap | None = None
+        self._index: mmap.mmap | None = None
+        self._users: dict[int, list[int]] = {}  # 未封存分段的内存索引
+        self.refresh()
+
+    def refresh(self) -> None:
+        self.close()
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self.count = size // _RECORD.size
+        if self.count and os.path.exists(self.range_path):
+            with open(self.range_path, "rb") as f:
+                self.first, self.last = _RANGE.unpack(f.read(_RANGE.size))
+            self.ordered = False
+        elif self.count:
+            with open(self.path, "rb") as f:
+                self.first = _RECORD.unpack(f.read(_RECORD.size))[0]
+                f.seek((self.count - 1) * _RECORD.size)
+                self.last = _RECORD.unpack(f.read(_RECORD.size))[0]
+
+    def add(self, ts: float) -> None:
+        """
+        更新新记录的时间范围
+        """
+        if ts < self.last:
+            self.ordered = False
+        if ts < self.first:
+            self.first = ts
+        if ts > self.last:
+            self.last = ts
+
+    def map(self) -> mmap.mmap:
+        if self._map is None:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def index(self) -> mmap.mmap:
+        if self._index is None:
+            with open(self.index_path, "rb") as f:
+                self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._index
+
+    def record(self, i: int) -> AuditRecord:
+        ts, user_id, kind, mid, result, extra = _RECORD.unpack_from(
+            self.map(), i * _RECORD.size
+        )
+        return AuditRecord(
+            ts, user_id, AuditKind(kind), mid, MsgResultCode(result), extra
+        )
+
+    def time_range(self, start: float, end: float) -> tuple[int, int]:
+        """
+        [start, end) 对应的记录号范围，只用于 ordered 的分段
+        """
+        mm = self.map()
+
+        def ts(i: int) -> float:
+            return _RECORD.unpack_from(mm, i * _RECORD.size)[0]
+
+        return _bisect(self.count, ts, start), _bisect(self.count, ts, end)
+
+    def user_records(self, user_id: int, lo: int, hi: int) -> list[int]:
+        """
+        用户在记录号 [lo, hi) 内的记录号
+        """
+        if not self.sealed:
+            rows = self._users.get(user_id, [])
+            at = rows.__getitem__
+            return rows[_bisect(len(rows), at, lo) : _bisect(len(rows), at, hi)]
+        idx = self.index()
+        n = len(idx) // _INDEX.size
+
+        def key(i: int) -> tuple:
+            return _INDEX.unpack_from(idx, i * _INDEX.size)
+
+        begin = _bisect(n, key, (user_id, lo))
+        stop = _bisect(n, key, (user_id, hi))
+        return [key(i)[1] for i in range(begin, stop)]
+
+    def rebuild_users(self) -> None:
+        """
+        重建未封存分段的内存索引和时间范围
+        """
+        self._users = {}
+        self.first = math.inf
+        self.last = -math.inf
+        self.ordered = True
+        if self.count:
+            mm = self.map()
+            for i in range(self.count):
+                ts, user_id = _RECORD.unpack_from(mm, i * _RECORD.size)[:2]
+                self._users.setdefault(user_id, []).append(i)
+                self.add(ts)
+            self.close()
+
+    def seal(self) -> None:
+        if not self.ordered:
+            # 先于索引写入，索引存在即视为封存
+            tmp = self.range_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(_RANGE.pack(self.first, self.last))
+            os.replace(tmp, self.range_path)
+        entries = sorted(
+            (user_id, i) for user_id, rows in self._users.items() for i in rows
+        )
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(_INDEX.pack(*entry) for entry in entries))
+        os.replace(tmp, self.index_path)
+        self.sealed = True
+        self._users = {}
+
+    def close(self) -> None:
+        for m in (self._map, self._index):
+            if m is not None:
+                m.close()
+        self._map = self._index = None
+
+
+class AuditLog:
+    def __init__(self, directory: str, segment_records: int = 1 << 20):
+        """
+
+        :param directory: 日志目录
+        :param segment_records: 每个分段的记录数
+        """
+        self.directory = directory
+        self.segment_records = segment_records
+        os.makedirs(directory, exist_ok=True)
+        numbers = sorted(
+            int(name[:-4]) for name in os.listdir(directory) if name.endswith(".seg")
+        )
+        self._segments = [_Segment(directory, n) for n in numbers]
+        if not self._segments or self._segments[-1].sealed:
+            self._segments.append(_Segment(directory, numbers[-1] + 1 if numbers else 0))
+        self._active = active = self._segments[-1]
+        size = active.count * _RECORD.size
+        if os.path.exists(active.path) and os.path.getsize(active.path) != size:
+            os.truncate(active.path, size)  # 上次退出时写了半条记录
+        active.rebuild_users()
+        self._file = open(active.path, "ab")
+        if active.count >= segment_records:  # 写满后未来得及封存
+            self._rotate()
+
+    def append(
+        self,
+        kind: AuditKind,
+        user_id: int | None,
+        mid: int,
+        result: int,
+        extra: int = 0,
+        ts: float | None = None,
+    ) -> None:
+        """
+        追加一条记录，时间戳早于之前的记录时照常保存，所在分段之后按顺序扫描查询
+        """
+        active = self._active
+        ts = time.time() if ts is None else ts
+        user_id = NO_USER if user_id is None else user_id
+        self._file.write(_RECORD.pack(ts, user_id, kind, mid, result, extra))
+        self._file.flush()
+        active._users.setdefault(user_id, []).append(active.count)
+        active.add(ts)
+        active.count += 1
+        active.close()  # 旧的 mmap 不包含新记录
+        if active.count >= self.segment_records:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._active.seal()
+        self._active = _Segment(self.directory, self._active.number + 1)
+        self._segments.append(self._active)
+        self._file = open(self._active.path, "ab")
+
+    def feed(self, event: Response | Note, ts: float | None = None) -> bool:
+        """
+        记录 Connection 产生的事件，其他事件忽略
+        :return: 是否记录
+        """
+        if isinstance(event, MidVerify):
+            self.append(
+                AuditKind.VERIFY,
+                event.user_id,
+                event.mid,
+                event.result,
+                event.unlock_status or 0,
+                ts,
+            )
+        elif isinstance(event, (MidEnroll, MidEnrollSingle)):
+            self.append(
+                AuditKind.ENROLL,
+                event.user_id,
+                event.mid,
+                event.result,
+                event.face_direction or 0,
+                ts,
+            )
+        elif isinstance(event, MidEnrollITG):
+            self.append(AuditKind.ENROLL, event.user_id, event.mid, event.result, 0, ts)
+        elif isinstance(event, MidEnrollWithPhoto):
+            # 中间分包的回复只有包序号，只记录失败和带用户ID的最后一包
+            if event.result == MsgResultCode.SUCCESS:
+                if len(event.data) < 4:
+                    return False
+                user_id = event.user_id
+            else:
+                user_id = None
+            self.append(AuditKind.ENROLL, user_id, event.mid, event.result, 0, ts)
+        elif isinstance(event, MidDelUser):
+            req = event.request
+            user_id = None
+            if req is not None and req.command == Command.DELETE_USER:
+                user_id = int.from_bytes(req.data[:2], "big")
+            self.append(AuditKind.DELETE, user_id, event.mid, event.result, 0, ts)
+        else:
+            return False
+        return True
+
+    def query(
+        self,
+        user_id: int | None = None,
+        start: float = -math.inf,
+        end: float = math.inf,
+    ) -> list[AuditRecord]:
+        """
+        查询 [start, end) 内的记录
+        :param user_id: None 则返回所有用户
+        """
+        records = []
+        for seg in self._segments:
+            if not seg.count or seg.last < start or seg.first >= end:
+                continue
+            if seg.ordered:
+                lo, hi = seg.time_range(start, end)
+            else:
+                lo, hi = 0, seg.count
+            if user_id is None:
+                rows = range(lo, hi)
+            else:
+                rows = seg.user_records(user_id, lo, hi)
+            if seg.ordered:
+                records.extend(seg.record(i) for i in rows)
+            else:
+                for i in rows:
+                    record = seg.record(i)
+                    if start <= record.timestamp < end:
+                        records.append(record)
+        return records
+
+    def close(self) -> None:
+        self._file.close()
+        for seg in self._segments:
+            seg.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,10 +1,27 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import struct
+import time
+from collections import deque
 from enum import Enum, auto
-from typing import Iterable
+from typing import TYPE_CHECKING, Callable, Iterable, NamedTuple
 
 from fm22x.note import Note
-from fm22x.request import SYNC_WORD, Request, calculate_checksum
-from fm22x.response import Response
+from fm22x.request import (
+    SYNC_WORD,
+    InitEncryption,
+    MidSetDebugEncKey,
+    MidSetReleaseEncKey,
+    Request,
+    calculate_checksum,
+    raw_request,
+)
+from fm22x.response import MID, MsgResultCode, Response
+
+if TYPE_CHECKING:
+    from fm22x.crypto import Cipher
+    from fm22x.trace import Tracer
 
 
 class _State(Enum):
@@ -12,18 +29,182 @@ class _State(Enum):
     read_data = auto()
 
 
+class PendingRequest(NamedTuple):
+    request: Request
+    sent: float  # 发送时的 time.monotonic()
+    encode: tuple[float, float] | None  # 设置 tracer 时编码的开始和结束时间
+
+
+SNAPSHOT_MAGIC = b"FMCS"
+SNAPSHOT_VERSION = 3
+# magic, version, read_data, msg_id(0xFF 为空), size, has_seed, seed, 是否加密, device_id 长度, enc_key_number 长度,
+# buffer 长度, pending 数量, 已加密帧数, 已解密帧数
+_SNAPSHOT = struct.Struct("<4sBBBHBIBBHIIQQ")
+_PENDING = struct.Struct("<BH")
+
+
 class Connection:
-    def __init__(self):
+    """
+    sans-io 的协议状态机，不是线程安全的：
+    receive 是生成器，send 和 receive 都会修改 pending 等状态，应只在一个线程中使用。
+    多线程共享请使用 fm22x.threadsafe.ThreadSafeConnection
+    """
+
+    def __init__(
+        self,
+        cipher: Cipher | None = None,
+        cipher_factory: Callable[[int, bytes, bytes], Cipher] | None = None,
+    ):
+        """
+
+        :param cipher: 加密模式下使用的负载加解密器，None 为明文模式
+        :param cipher_factory: MidInitEncryption 成功后以 (seed, device_id, enc_key_number)
+                               调用，返回值作为之后的 cipher。None 则不切换，需要调用方自行设置
+        """
         self.buffer = bytearray()
         self.state = _State.read_header
+        self.cipher = cipher
+        self.cipher_factory = cipher_factory
+        # 加密模式下 send 复用的缓冲区，不够时换一块新的，已返回的视图不受影响
+        self._send_buf = bytearray()
+        self._send_view = memoryview(self._send_buf)
 
         self._size = None  # tmp packet
         self._msg_id = None  # tmp packet
+        # 已发送未收到回复的请求，以命令字为键，同一命令字按发送顺序排队。
+        # 回复丢失时用 cancel/expire 移除，否则之后的回复会对应到更早的请求
+        self.pending: dict[int, deque[PendingRequest]] = {}
+        # receive_frames 最近一个 reply 对应的请求
+        self.last_pending: PendingRequest | None = None
+        self._seed: int | None = None
+        self._enc_key_number = b""
+        self._device_id = b""  # MidInitEncryption 返回的设备ID
+
+        self.tracer: Tracer | None = None  # 设置后记录每帧各阶段耗时
+        self._first_byte = 0.0  # 下一帧首字节到达时间
+        self._frame_first = 0.0  # 当前帧首字节到达时间
+        self._last_byte = 0.0  # 当前帧末字节到达时间
+        self._frame_done = 0.0  # 当前帧校验和解密完成时间
+
+    @property
+    def last_request(self) -> Request | None:
+        last = self.last_pending
+        return None if last is None else last.request
+
+    def _track(
+        self, req: Request, encode: tuple[float, float] | None = None
+    ) -> None:
+        queue = self.pending.get(req.command)  # type: ignore
+        if queue is None:
+            queue = self.pending[req.command] = deque()  # type: ignore
+        queue.append(PendingRequest(req, time.monotonic(), encode))
+        if isinstance(req, InitEncryption):
+            self._seed = req.seed
+        elif isinstance(req, (MidSetReleaseEncKey, MidSetDebugEncKey)):
+            self._enc_key_number = req.enc_key_number
+
+    def send(self, req: Request) -> bytes | memoryview:
+        """
+        编码请求并记入 pending
+        :return: 明文模式为 bytes；加密模式为内部发送缓冲区的视图，下一次 send 前有效，需要保留请自行拷贝
+        """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        if self.cipher is None:
+            frame = req.encode()
+        else:
+            length = req.size + 6
+            if len(self._send_buf) < length:
+                self._send_buf = bytearray(max(length, 2 * len(self._send_buf)))
+                self._send_view = memoryview(self._send_buf)
+            req.encode_into(self._send_buf)
+            self._seal(self._send_view, 0, length)
+            frame = self._send_view[:length]
+        if tracer is None:
+            self._track(req)
+        else:
+            end = tracer.clock()
+            self._track(req, (start, end))
+            tracer.on_send(req, start, end)
+        return frame
 
-    def send(self, req: Request) -> bytes:
-        return req.encode()
+    def send_many(
+        self, reqs: Iterable[Request], vectored: bool = False
+    ) -> bytearray | list[memoryview]:
+        """
+        把多个请求编码进同一块预分配的缓冲区
+        :param reqs: 请求
+        :param vectored: True 则返回每帧一个 memoryview，可直接用于 os.writev
+        :return: 连续的缓冲区或 memoryview 列表
+        """
+        reqs = list(reqs)
+        buf = bytearray(sum(req.size + 6 for req in reqs))
+        view = memoryview(buf)
+        bounds = []
+        offset = 0
+        tracer = self.tracer
+        for req in reqs:
+            if tracer is not None:
+                begin = tracer.clock()
+            start = offset
+            offset = req.encode_into(buf, offset)
+            if self.cipher is not None:
+                self._seal(view, start, offset)
+            bounds.append((start, offset))
+            if tracer is None:
+                self._track(req)
+            else:
+                end = tracer.clock()
+                self._track(req, (begin, end))
+                tracer.on_send(req, begin, end)
+        if not vectored:
+            return buf
+        return [view[start:end] for start, end in bounds]
+
+    def _seal(self, view: memoryview, start: int, end: int) -> None:
+        """
+        原地加密 view[start:end] 中一帧的负载并重新计算校验和
+        """
+        self.cipher.encrypt_into(view[start + 5 : end - 1])  # type: ignore
+        view[end - 1] = calculate_checksum(view[start : end - 1])
 
     def receive(self, data: bytes) -> Iterable[Response | Note]:
+        tracer = self.tracer
+        for msg_id, payload in self.receive_frames(data):
+            if tracer is not None:
+                start = tracer.clock()
+            if msg_id == 0x00:
+                ev = self._generate_response(payload)
+            else:
+                ev = self._generate_note(payload)
+            if tracer is not None:
+                last = self.last_pending if msg_id == 0x00 else None
+                tracer.on_frame(
+                    ev,
+                    self._frame_first,
+                    self._last_byte,
+                    self._frame_done,
+                    start,
+                    tracer.clock(),
+                    None if last is None else last.encode,
+                )
+            yield ev
+
+    def receive_frames(self, data: bytes) -> Iterable[tuple[int, bytearray]]:
+        """
+        只做分帧、校验和解密，不构造 Response/Note。
+        reply 帧在 yield 前从 pending 中取出对应的请求存入 last_pending，
+        MidInitEncryption 成功时用 cipher_factory 切换加解密器，之后的帧按新密钥解密
+        :param data: 收到的原始字节
+        :return: (msg_id, 负载) 负载以 mid/nid 开头
+        """
+        tracer = self.tracer
+        if tracer is not None:
+            now = tracer.clock()
+            if not self.buffer:
+                self._first_byte = now
+            self._last_byte = now
         self.buffer.extend(data)
         while True:
             if self.state == _State.read_header:
@@ -38,24 +219,211 @@ class Connection:
                 self._size = int.from_bytes(self.buffer[3:5], "big")
                 self.state = _State.read_data
             if self.state == _State.read_data:
-                if len(self.buffer) < self._size + 6:
+                size = self._size
+                if len(self.buffer) < size + 6:
                     break
-                data = self.buffer[5 : 5 + self._size]
-                checksum = self.buffer[5 + self._size]
-                if checksum != calculate_checksum(self.buffer[: 5 + self._size]):
+                checksum = self.buffer[5 + size]
+                if checksum != calculate_checksum(self.buffer[: 5 + size]):
                     raise ValueError("Invalid checksum")
-                if self._msg_id == 0x00:
-                    yield self._generate_response(data)
-                else:
-                    yield self._generate_note(data)
-                del self.buffer[: self._size + 6]
+                # 先取出这一帧并更新全部状态再 yield，调用者中途退出或抛出异常时不会重复处理
+                msg_id = self._msg_id
+                data = self.buffer[5 : 5 + size]
+                del self.buffer[: size + 6]
                 self.state = _State.read_header
+                if self.cipher is not None:
+                    with memoryview(data) as view:
+                        self.cipher.decrypt_into(view)
+                if msg_id == 0x00 and data:
+                    self.last_pending = self._match(data[0])
+                    if (
+                        data[0] == MID.MID_INIT_ENCRYPTION
+                        and len(data) > 1
+                        and data[1] == MsgResultCode.SUCCESS
+                        and self._seed is not None
+                    ):
+                        self._device_id = bytes(data[2:])
+                        if self.cipher_factory is not None:
+                            self._switch_cipher()
+                if tracer is not None:
+                    self._frame_done = tracer.clock()
+                    self._frame_first = self._first_byte
+                    self._first_byte = self._last_byte
+                yield msg_id, data  # type: ignore
+
+    def resync(self) -> int:
+        """
+        receive 抛出 ValueError 后调用，丢弃缓冲区中直到下一个同步字的数据。
+        之后用 receive(b"") 继续解析缓冲区中剩余的帧。
+        被丢弃的可能是任意一个回复，无法再确定之后的回复对应哪个请求，因此同时清空 pending，
+        之后收到的这些回复 request 为 None
+        :return: 丢弃的字节数
+        """
+        self.pending.clear()
+        buf = self.buffer
+        drop = buf.find(SYNC_WORD, 1)
+        if drop < 0:
+            # 末尾可能是半个同步字
+            drop = len(buf) - 1 if buf.endswith(SYNC_WORD[:1]) else len(buf)
+        del buf[:drop]
+        self.state = _State.read_header
+        self._size = None
+        self._msg_id = None
+        return drop
+
+    def _match(self, mid: int) -> PendingRequest | None:
+        """
+        取出 mid 对应的最早发送的请求
+        """
+        queue = self.pending.get(mid)
+        if not queue:
+            return None
+        entry = queue.popleft()
+        if not queue:
+            del self.pending[mid]
+        return entry
+
+    def cancel(self, req: Request) -> bool:
+        """
+        不再等待 req 的回复，例如调用方超时
+        :return: req 是否在 pending 中
+        """
+        queue = self.pending.get(req.command)  # type: ignore
+        if not queue:
+            return False
+        for entry in queue:
+            if entry.request is req:
+                queue.remove(entry)
+                if not queue:
+                    del self.pending[req.command]  # type: ignore
+                return True
+        return False
+
+    def expire(self, older_than: float, now: float | None = None) -> list[Request]:
+        """
+        移除等待回复超过 older_than 秒的请求
+        :param now: time.monotonic() 的值，默认当前时间
+        :return: 被移除的请求
+        """
+        deadline = (time.monotonic() if now is None else now) - older_than
+        expired = []
+        for command in list(self.pending):
+            queue = self.pending[command]
+            while queue and queue[0].sent < deadline:
+                expired.append(queue.popleft().request)
+            if not queue:
+                del self.pending[command]
+        return expired
+
+    def _switch_cipher(self) -> None:
+        self.cipher = self.cipher_factory(  # type: ignore
+            self._seed, self._device_id, self._enc_key_number  # type: ignore
+        )
 
     def _generate_response(self, data: bytes) -> Response:
         d = Response.decode(data)
-        if d.mid == 19:
-            pass
+        d.request = self.last_request
         return d
 
     def _generate_note(self, data: bytes) -> Note:
         return Note.decode(data)
+
+    def snapshot(self) -> bytes:
+        """
+        序列化解析状态、未完成的帧和等待回复的请求，用于进程交接。
+        恢复后请求的发送时间按恢复时计算
+        加密模式下只保存 seed、device_id、enc_key_number 和帧计数，不保存会话密钥，
+        恢复时需要传入 cipher 或 cipher_factory
+        """
+        cipher = self.cipher
+        parts = [
+            _SNAPSHOT.pack(
+                SNAPSHOT_MAGIC,
+                SNAPSHOT_VERSION,
+                self.state == _State.read_data,
+                0xFF if self._msg_id is None else self._msg_id,
+                self._size if self.state == _State.read_data else 0,
+                self._seed is not None,
+                self._seed or 0,
+                cipher is not None,
+                len(self._device_id),
+                len(self._enc_key_number),
+                len(self.buffer),
+                sum(len(queue) for queue in self.pending.values()),
+                0 if cipher is None else cipher.tx,
+                0 if cipher is None else cipher.rx,
+            ),
+            self._device_id,
+            self._enc_key_number,
+            bytes(self.buffer),
+        ]
+        for command, queue in self.pending.items():
+            for entry in queue:
+                data = entry.request.data
+                parts.append(_PENDING.pack(command, len(data)))
+                parts.append(data)
+        return b"".join(parts)
+
+    @classmethod
+    def restore(
+        cls,
+        data: bytes,
+        cipher: Cipher | None = None,
+        cipher_factory: Callable[[int, bytes, bytes], Cipher] | None = None,
+    ) -> Connection:
+        """
+        从 snapshot() 的结果恢复
+        :param cipher: 加密模式下使用的加解密器，帧计数按快照恢复。
+                       None 则以快照中的 (seed, device_id, enc_key_number) 调用 cipher_factory
+        :param cipher_factory: 同 __init__
+        """
+        (
+            magic,
+            version,
+            read_data,
+            msg_id,
+            size,
+            has_seed,
+            seed,
+            encrypted,
+            id_len,
+            enc_len,
+            buf_len,
+            pending,
+            tx,
+            rx,
+        ) = _SNAPSHOT.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Invalid snapshot")
+        offset = _SNAPSHOT.size
+        device_id = bytes(data[offset : offset + id_len])
+        offset += id_len
+        enc_key_number = bytes(data[offset : offset + enc_len])
+        offset += enc_len
+        if encrypted and cipher is None:
+            if cipher_factory is None or not has_seed or not device_id:
+                raise ValueError("Encrypted snapshot needs cipher or cipher_factory")
+            cipher = cipher_factory(seed, device_id, enc_key_number)
+        if cipher is not None:
+            cipher.tx = tx
+            cipher.rx = rx
+        con = cls(cipher, cipher_factory)
+        con._device_id = device_id
+        con._enc_key_number = enc_key_number
+        con.buffer = bytearray(data[offset : offset + buf_len])
+        offset += buf_len
+        for _ in range(pending):
+            command, length = _PENDING.unpack_from(data, offset)
+            offset += _PENDING.size
+            con._track(raw_request(command, data[offset : offset + length]))
+            offset += length
+        if offset != len(data):
+            raise ValueError("Invalid snapshot")
+        if read_data:
+            con.state = _State.read_data
+            con._size = size
+        if msg_id != 0xFF:
+            con._msg_id = msg_id
+        if has_seed:
+            con._seed = seed
+        return con
+
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import functools
+import hashlib
+from typing import Protocol
+
+KEY_SIZE = 16
+_INPLACE_MAX = 8  # 不超过此长度的负载逐字节原地异或，更长的用大整数异或更快
+
+
+@functools.lru_cache(maxsize=32)
+def derive_session_key(
+    seed: int, device_id: bytes, enc_key_number: bytes = b""
+) -> bytes:
+    """
+    由 InitEncryption 的随机种子和模组返回的 device_id 生成会话密钥，结果会被缓存
+    :param seed: InitEncryption 发送的随机种子
+    :param device_id: MidInitEncryption 返回的设备ID
+    :param enc_key_number: MidSetReleaseEncKey/MidSetDebugEncKey 设置的加密序列
+    :return: 16字节会话密钥
+    """
+    return hashlib.sha256(
+        enc_key_number + seed.to_bytes(4, "big") + device_id
+    ).digest()[:KEY_SIZE]
+
+
+class Cipher(Protocol):
+    """
+    帧负载加解密，必须原地修改且不改变长度。
+    每帧调用一次 encrypt_into/decrypt_into，tx/rx 为已处理的帧数，随快照保存，
+    Connection.restore 会在新建的 cipher 上设置这两个属性
+    """
+
+    tx: int  # 已加密的帧数
+    rx: int  # 已解密的帧数
+
+    def encrypt_into(self, buf: memoryview) -> None: ...
+
+    def decrypt_into(self, buf: memoryview) -> None: ...
+
+
+class XorCipher(Cipher):
+    """
+    以会话密钥、方向和帧序号展开的密钥流做异或，每帧的密钥流都不同。
+    两端的帧序号必须一致，丢帧后需要重新 InitEncryption。
+    不是模组固件的算法，只适用于两端都由本库实现的场景（模拟器、测试）
+    """
+
+    def __init__(self, key: bytes, host: bool = True, tx: int = 0, rx: int = 0):
+        """
+
+        :param key: 会话密钥
+        :param host: 主机端为 True，模组端为 False，两个方向使用不同的密钥流
+        :param tx: 已加密的帧数
+        :param rx: 已解密的帧数
+        """
+        if not key:
+            raise ValueError("Empty key")
+        self.key = key
+        self.host = host
+        self.tx = tx
+        self.rx = rx
+        # 已吸收 key 和方向的哈希状态，每帧复制后只需再吸收帧序号
+        host_stream = hashlib.shake_128(key + b"H")
+        device_stream = hashlib.shake_128(key + b"D")
+        self._tx_stream = host_stream if host else device_stream
+        self._rx_stream = device_stream if host else host_stream
+
+    @staticmethod
+    def _xor(buf: memoryview, base, seq: int) -> None:
+        n = len(buf)
+        if n:
+            stream = base.copy()
+            stream.update(seq.to_bytes(8, "big"))
+            mask = stream.digest(n)
+            if n <= _INPLACE_MAX:
+                for i in range(n):
+                    buf[i] ^= mask[i]
+            else:
+                value = int.from_bytes(buf, "little") ^ int.from_bytes(mask, "little")
+                buf[:] = value.to_bytes(n, "little")
+
+    def encrypt_into(self, buf: memoryview) -> None:
+        self._xor(buf, self._tx_stream, self.tx)
+        self.tx += 1
+
+    def decrypt_into(self, buf: memoryview) -> None:
+        self._xor(buf, self._rx_stream, self.rx)
+        self.rx += 1
+
+
+def xor_session_cipher(
+    seed: int, device_id: bytes, enc_key_number: bytes = b""
+) -> XorCipher:
+    """
+    Connection 的 cipher_factory，由 derive_session_key 生成主机端的 XorCipher
+    """
+    return XorCipher(derive_session_key(seed, device_id, enc_key_number))
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+按 MID/NID（可选 MsgResultCode）分发事件，代替 isinstance 链
+
+    dispatcher = Dispatcher()
+
+    @dispatcher.on(MidVerify, MsgResultCode.SUCCESS)
+    def unlocked(resp: MidVerify): ...
+
+    dispatcher.feed(con, serial.read())
+
+feed 直接处理 Connection.receive_frames 的输出，每帧只查一次表，没有订阅的帧不构造 Response/Note
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Union
+
+from fm22x.note import NID, Note, NoteMeta
+from fm22x.response import MID, MsgResultCode, Response, ResponseMeta
+
+if TYPE_CHECKING:
+    from fm22x.connection import Connection
+
+Handler = Callable[[Union[Response, Note]], object]
+
+# 表的键：reply 为 mid << 8 | result，note 为 _NOTE | nid
+_NOTE = 0x10000
+
+
+def _resolve(kind) -> tuple[int, int, type]:
+    """
+    :param kind: Response/Note 子类或 MID/NID
+    :return: (msg_id, mid/nid, 注册的类)
+    """
+    if isinstance(kind, type):
+        if issubclass(kind, Response) and kind is not Response:
+            kind = kind.mid  # type: ignore
+        elif issubclass(kind, Note) and kind is not Note:
+            kind = kind.nid  # type: ignore
+        else:
+            raise ValueError(f"Cannot subscribe to {kind!r}")
+    if isinstance(kind, MID):
+        if kind not in ResponseMeta.register_types:
+            raise ValueError(f"No response registered for {kind!r}")
+        return 0x00, int(kind), ResponseMeta.register_types[kind]
+    if isinstance(kind, NID):
+        if kind not in NoteMeta.register_types:
+            raise ValueError(f"No note registered for {kind!r}")
+        return 0x01, int(kind), NoteMeta.register_types[kind]
+    raise ValueError(f"Cannot subscribe to {kind!r}, use a class, MID or NID")
+
+
+class Dispatcher:
+    def __init__(self):
+        # (msg_id, mid/nid, result 或 None) -> handlers
+        self._subs: dict[tuple[int, int, int | None], list[Handler]] = {}
+        # 键 -> (类, handlers)
+        self._table: dict[int, tuple[type, tuple[Handler, ...]]] = {}
+        self.skipped = 0  # 没有订阅而未构造的帧数
+
+    def subscribe(
+        self, kind, handler: Handler, result: MsgResultCode | int | None = None
+    ) -> None:
+        """
+        :param kind: Response/Note 子类或 MID/NID
+        :param handler: 收到事件时调用
+        :param result: 只接收该结果的 reply，None 则接收所有结果
+        """
+        msg_id, code, _ = _resolve(kind)
+        if result is not None:
+            if msg_id != 0x00:
+                raise ValueError("Notes have no result code")
+            result = int(MsgResultCode(result))
+        self._subs.setdefault((msg_id, code, result), []).append(handler)
+        self._rebuild()
+
+    def unsubscribe(
+        self, kind, handler: Handler, result: MsgResultCode | int | None = None
+    ) -> None:
+        msg_id, code, _ = _resolve(kind)
+        key = (msg_id, code, None if result is None else int(result))
+        handlers = self._subs.get(key)
+        if not handlers or handler not in handlers:
+            raise ValueError("Handler not subscribed")
+        handlers.remove(handler)
+        if not handlers:
+            del self._subs[key]
+        self._rebuild()
+
+    def on(self, kind, result: MsgResultCode | int | None = None):
+        """
+        subscribe 的装饰器形式
+        """
+
+        def deco(handler: Handler) -> Handler:
+            self.subscribe(kind, handler, result)
+            return handler
+
+        return deco
+
+    def _rebuild(self) -> None:
+        """
+        把按结果订阅和不限结果的订阅展开成每个 (mid, result) 一项
+        """
+        table: dict[int, tuple[type, tuple[Handler, ...]]] = {}
+        for msg_id, code, result in self._subs:
+            if msg_id == 0x01:
+                table[_NOTE | code] = (
+                    NoteMeta.register_types[code],
+                    tuple(self._subs[(msg_id, code, None)]),
+                )
+                continue
+            cls = ResponseMeta.register_types[code]
+            for r in MsgResultCode if result is None else (result,):
+                handlers = self._subs.get((msg_id, code, None), []) + self._subs.get(
+                    (msg_id, code, int(r)), []
+                )
+                table[code << 8 | r] = (cls, tuple(handlers))
+        self._table = table
+
+    def dispatch(self, event: Response | Note) -> bool:
+        """
+        分发已经构造好的事件，例如 Connection.receive 或 EventBusReader.poll 的输出
+        :return: 是否有订阅者
+        """
+        if isinstance(event, Response):
+            entry = self._table.get(event.mid << 8 | event.result)
+        else:
+            entry = self._table.get(_NOTE | event.nid)
+        if entry is None:
+            return False
+        for handler in entry[1]:
+            handler(event)
+        return True
+
+    def dispatch_frame(self, msg_id: int, payload: bytes) -> bool:
+        """
+        分发一帧负载，例如 EventBusReader.poll_raw 的输出，没有订阅者时不构造事件。
+        不会关联请求，需要 Response.request 请使用 feed
+        :param msg_id: 0 为 reply，1 为 note
+        :param payload: 以 mid/nid 开头的负载
+        :return: 是否有订阅者，不完整的帧计入 skipped
+        """
+        if len(payload) < (2 if msg_id == 0x00 else 1):
+            self.skipped += 1
+            return False
+        if msg_id == 0x00:
+            entry = self._table.get(payload[0] << 8 | payload[1])
+            if entry is None:
+                self.skipped += 1
+                return False
+            cls, handlers = entry
+            event = cls(payload[0], payload[1], payload[2:])
+        else:
+            entry = self._table.get(_NOTE | payload[0])
+            if entry is None:
+                self.skipped += 1
+                return False
+            cls, handlers = entry
+            event = cls(payload[0], payload[1:])
+        for handler in handlers:
+            handler(event)
+        return True
+
+    def feed(self, con: Connection, data: bytes) -> int:
+        """
+        代替 Connection.receive：分帧并分发，没有订阅者的帧不构造事件。
+        pending 和会话密钥由 receive_frames 维护，不完整的帧计入 skipped
+        :return: 分发的帧数
+        """
+        table = self._table
+        count = 0
+        for msg_id, payload in con.receive_frames(data):
+            if len(payload) < (2 if msg_id == 0x00 else 1):
+                self.skipped += 1
+                continue
+            if msg_id == 0x00:
+                mid = payload[0]
+                entry = table.get(mid << 8 | payload[1])
+                if entry is None:
+                    self.skipped += 1
+                    continue
+                event = entry[0](mid, payload[1], payload[2:])
+                event.request = con.last_request
+            else:
+                entry = table.get(_NOTE | payload[0])
+                if entry is None:
+                    self.skipped += 1
+                    continue
+                event = entry[0](payload[0], payload[1:])
+            for handler in entry[1]:
+                handler(event)
+            count += 1
+        return count
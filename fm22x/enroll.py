@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+多方向交互录入流程，根据人脸状态 note 提前中止并只重试缺失的方向
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from fm22x.note import FaceState, NidFaceState, Note
+from fm22x.request import Enroll, FaceDir, FaceReset, Request
+from fm22x.response import MidEnroll, MidFaceReset, MsgResultCode, Response
+
+DEFAULT_DIRECTIONS = (
+    FaceDir.MIDDLE,
+    FaceDir.UP,
+    FaceDir.DOWN,
+    FaceDir.LEFT,
+    FaceDir.RIGHT,
+)
+
+OCCLUSION_STATES = frozenset(
+    (
+        FaceState.EYEBROW_OCCLUSION,
+        FaceState.EYE_OCCLUSION,
+        FaceState.FACE_OCCLUSION,
+    )
+)
+
+# 重试也不会成功的结果
+FATAL_RESULTS = frozenset(
+    (
+        MsgResultCode.FAILED4_INVALIDPARAM,
+        MsgResultCode.FAILED4_MAXUSER,
+        MsgResultCode.FAILED4_FACEENROLLED,
+        MsgResultCode.FAILED4_CAMERA,
+        MsgResultCode.FAILED4_NOMEMORY,
+    )
+)
+
+
+class EnrollWorkflow:
+    """
+    sans-io 状态机：start() 和 feed() 返回需要发送的请求。
+    MidEnroll 按 Response.request 与当前的 Enroll 对应，被中止的录入的回复（可能不来）会被忽略
+    """
+
+    def __init__(
+        self,
+        user_name: str,
+        admin: bool = False,
+        directions: Iterable[FaceDir] = DEFAULT_DIRECTIONS,
+        timeout: int = 10,
+        noface_limit: int = 10,
+        occlusion_limit: int = 10,
+        max_attempts: int = 3,
+    ):
+        """
+
+        :param user_name: 录入用户姓名
+        :param admin: 是否设置为管理员
+        :param directions: 需要录入的方向，按顺序录入
+        :param timeout: 每个方向的录入超时时间（单位s）
+        :param noface_limit: 连续多少个 NOFACE note 后中止当前方向
+        :param occlusion_limit: 连续多少个遮挡 note 后中止当前方向
+        :param max_attempts: 每个方向最多尝试次数
+        """
+        self.user_name = user_name
+        self.admin = admin
+        self.directions = tuple(directions)
+        self.timeout = timeout
+        self.noface_limit = noface_limit
+        self.occlusion_limit = occlusion_limit
+        self.max_attempts = max_attempts
+
+        self.face_direction = 0  # 已完成方向的掩码
+        self.user_id: int | None = None
+        self.current: FaceDir | None = None
+        self.error: MsgResultCode | None = None
+        self.aborts = 0
+        self.attempts = {d: 0 for d in self.directions}
+
+        self._aborting = False
+        self._active: Enroll | None = None  # 已发送、尚未收到回复的 Enroll
+        self._noface = 0
+        self._occlusion = 0
+
+    @property
+    def missing(self) -> list[FaceDir]:
+        return [d for d in self.directions if not self.face_direction & d]
+
+    @property
+    def finished(self) -> bool:
+        return not self.missing
+
+    @property
+    def failed(self) -> bool:
+        """
+        出现不可重试的错误，或缺失的方向已用完尝试次数
+        """
+        if self.error is not None:
+            return True
+        if self.current is not None or self._aborting:
+            return False
+        missing = self.missing
+        return bool(missing) and all(
+            self.attempts[d] >= self.max_attempts for d in missing
+        )
+
+    def start(self) -> list[Request]:
+        return self._next()
+
+    def _next(self) -> list[Request]:
+        self.current = None
+        self._noface = self._occlusion = 0
+        if self.error is not None:
+            return []
+        for d in self.missing:
+            if self.attempts[d] < self.max_attempts:
+                self.attempts[d] += 1
+                self.current = d
+                self._active = Enroll(self.admin, self.user_name, d, self.timeout)
+                return [self._active]
+        self._active = None
+        return []
+
+    def feed(self, event: Response | Note) -> list[Request]:
+        """
+        输入 Connection 产生的事件
+        :return: 需要发送的请求
+        """
+        if isinstance(event, NidFaceState):
+            return self._on_face(event)
+        if isinstance(event, MidEnroll):
+            return self._on_enroll(event)
+        if isinstance(event, MidFaceReset) and self._aborting:
+            return self._on_reset(event)
+        return []
+
+    def _on_face(self, note: NidFaceState) -> list[Request]:
+        if self.current is None or self._aborting:
+            return []
+        state = note.state
+        self._noface = self._noface + 1 if state == FaceState.NOFACE else 0
+        self._occlusion = self._occlusion + 1 if state in OCCLUSION_STATES else 0
+        if self._noface >= self.noface_limit or self._occlusion >= self.occlusion_limit:
+            self._aborting = True
+            self.aborts += 1
+            return [FaceReset()]
+        return []
+
+    def _on_reset(self, resp: MidFaceReset) -> list[Request]:
+        self._aborting = False
+        if resp.result != MsgResultCode.SUCCESS and self._active is not None:
+            # 没能中止，当前的录入仍在进行，等它的回复
+            self._noface = self._occlusion = 0
+            return []
+        return self._next()
+
+    def _on_enroll(self, resp: MidEnroll) -> list[Request]:
+        if resp.request is not None and resp.request is not self._active:
+            return []  # 之前被中止的录入，回复可能晚于 MidFaceReset
+        if self._active is None or self.current is None:
+            return []
+        self._active = None
+        if resp.result == MsgResultCode.SUCCESS:
+            self.face_direction |= resp.face_direction | self.current
+            self.user_id = resp.user_id
+        elif resp.result in FATAL_RESULTS:
+            self.error = resp.result
+        if self._aborting:
+            return []  # 在中止前已经结束，等 MidFaceReset 后再继续
+        return self._next()
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+把事件流按消息类型直接解码为列式数组，分块写成 .npy/.npz，
+可以用 numpy.load(..., mmap_mode="r") 直接映射，不需要为每个事件创建对象
+"""
+from __future__ import annotations
+
+import ast
+import mmap
+import os
+import sys
+import time
+import zipfile
+from array import array
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from fm22x.note import FACE_SIZE, NID, decode_face
+from fm22x.response import MID
+
+if TYPE_CHECKING:
+    from fm22x.connection import Connection
+
+_DESCR = {"B": "|u1", "H": "<u2", "h": "<i2", "d": "<f8"}
+_TYPECODE = {v: k for k, v in _DESCR.items()}
+
+
+def _npy_header(typecode: str, length: int) -> bytes:
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (
+        _DESCR[typecode],
+        length,
+    )
+    header += " " * (63 - (10 + len(header)) % 64) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode()
+
+
+def _npy_bytes(arr: array) -> bytes:
+    if sys.byteorder == "big" and arr.itemsize > 1:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return _npy_header(arr.typecode, len(arr)) + arr.tobytes()
+
+
+def write_npy(path: str, arr: array) -> None:
+    """
+    以 npy 1.0 格式写出一维数组
+    """
+    with open(path, "wb") as f:
+        f.write(_npy_bytes(arr))
+
+
+def open_npy(path: str) -> memoryview:
+    """
+    以只读 mmap 打开 write_npy 写出的文件，返回零拷贝的 memoryview
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return _npy_view(mm)
+
+
+def open_npz(path: str) -> dict[str, memoryview]:
+    """
+    读取 npz=True 写出的块，返回 列名 -> memoryview
+    """
+    with zipfile.ZipFile(path) as zf:
+        return {
+            name[:-4]: _npy_view(zf.read(name))
+            for name in zf.namelist()
+            if name.endswith(".npy")
+        }
+
+
+def _npy_view(buf) -> memoryview:
+    if buf[:6] != b"\x93NUMPY":
+        raise ValueError("Invalid npy file")
+    header_len = int.from_bytes(buf[8:10], "little")
+    header = ast.literal_eval(bytes(buf[10 : 10 + header_len]).decode())
+    typecode = _TYPECODE[header["descr"]]
+    if sys.byteorder == "big" and typecode != "B":
+        raise ValueError("Byte order mismatch")
+    return memoryview(buf)[10 + header_len :].cast(typecode)
+
+
+def _response(p: bytearray) -> tuple:
+    return p[0], p[1]
+
+
+def _verify(p: bytearray) -> tuple:
+    if p[1] == 0 and len(p) >= 6:
+        return p[1], int.from_bytes(p[2:4], "big"), p[-2], p[-1]
+    return p[1], 0, 0, 0
+
+
+def _enroll(p: bytearray) -> tuple:
+    if p[1] == 0 and len(p) >= 5:
+        return p[1], int.from_bytes(p[2:4], "big"), p[4]
+    return p[1], 0, 0
+
+
+def _face_state(p: bytearray) -> tuple | None:
+    if len(p) < 1 + FACE_SIZE:
+        return None
+    return decode_face(p, 1)
+
+
+class Table:
+    """
+    一种消息类型的列集合，第一列固定为时间戳
+    """
+
+    def __init__(
+        self,
+        name: str,
+        columns: list[tuple[str, str]],
+        extract: Callable[[bytearray], tuple | None],
+    ):
+        """
+
+        :param name: 表名，也是输出目录名
+        :param columns: (列名, array typecode)，不含时间戳列
+        :param extract: 从负载中提取一行，返回 None 表示丢弃
+        """
+        self.name = name
+        self.columns = [("timestamp", "d")] + columns
+        self.extract = extract
+        self.chunk = 0
+        self._arrays = [array(tc) for _, tc in self.columns]
+
+    def __len__(self):
+        return len(self._arrays[0])
+
+    def append(self, payload: bytearray, ts: float) -> None:
+        row = self.extract(payload)
+        if row is None:
+            return
+        arrays = self._arrays
+        arrays[0].append(ts)
+        for arr, value in zip(arrays[1:], row):
+            arr.append(value)
+
+    def flush(self, directory: str, npz: bool = False) -> str | None:
+        """
+        写出当前块并清空
+        :return: 写出的路径
+        """
+        if not len(self):
+            return None
+        base = os.path.join(directory, self.name)
+        os.makedirs(base, exist_ok=True)
+        if npz:
+            path = os.path.join(base, f"{self.chunk:06d}.npz")
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+                for (name, _), arr in zip(self.columns, self._arrays):
+                    zf.writestr(f"{name}.npy", _npy_bytes(arr))
+        else:
+            path = os.path.join(base, f"{self.chunk:06d}")
+            os.makedirs(path, exist_ok=True)
+            for (name, _), arr in zip(self.columns, self._arrays):
+                write_npy(os.path.join(path, f"{name}.npy"), arr)
+        self.chunk += 1
+        self._arrays = [array(tc) for _, tc in self.columns]
+        return path
+
+
+def default_tables() -> dict[tuple[int, int], Table]:
+    """
+    (msg_id, mid/nid) -> Table，msg_id 0 为 reply，1 为 note；mid 为 -1 表示所有 reply
+    """
+    return {
+        (0x00, -1): Table("response", [("mid", "B"), ("result", "B")], _response),
+        (0x00, MID.MID_VERIFY): Table(
+            "verify",
+            [("result", "B"), ("user_id", "H"), ("admin", "B"), ("unlock_status", "B")],
+            _verify,
+        ),
+        (0x00, MID.MID_ENROLL): Table(
+            "enroll",
+            [("result", "B"), ("user_id", "H"), ("face_direction", "B")],
+            _enroll,
+        ),
+        (0x01, NID.FACE_STATE): Table(
+            "face_state",
+            [
+                ("state", "H"),
+                ("left", "H"),
+                ("top", "H"),
+                ("right", "H"),
+                ("bottom", "H"),
+                ("yaw", "h"),
+                ("pitch", "h"),
+                ("roll", "h"),
+            ],
+            _face_state,
+        ),
+    }
+
+
+class ColumnarExporter:
+    """
+    列式导出器，每个表攒满 chunk_rows 行写出一个块
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        chunk_rows: int = 65536,
+        npz: bool = False,
+        tables: dict[tuple[int, int], Table] | None = None,
+    ):
+        """
+
+        :param directory: 输出目录
+        :param chunk_rows: 每块行数
+        :param npz: True 则每块写成一个不压缩的 npz，否则每列一个 npy
+        :param tables: 自定义表，默认 default_tables()
+        """
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.npz = npz
+        self.tables = default_tables() if tables is None else tables
+        self.written: list[str] = []
+
+    def feed_frame(self, msg_id: int, payload: bytearray, ts: float) -> None:
+        if len(payload) < (2 if msg_id == 0x00 else 1):
+            # 截断的 reply 或空 note，没有可解码的列
+            return
+        tables = self.tables
+        for key in ((msg_id, payload[0]), (msg_id, -1)):
+            table = tables.get(key)
+            if table is not None:
+                table.append(payload, ts)
+                if len(table) >= self.chunk_rows:
+                    self._flush_table(table)
+
+    def consume(
+        self, con: Connection, data: bytes, ts: float | None = None
+    ) -> None:
+        """
+        直接从 Connection 的原始帧导出
+        :param ts: 时间戳，默认 time.time()
+        """
+        if ts is None:
+            ts = time.time()
+        for msg_id, payload in con.receive_frames(data):
+            self.feed_frame(msg_id, payload, ts)
+
+    def consume_capture(
+        self, con: Connection, chunks: Iterable[tuple[float, bytes]]
+    ) -> None:
+        """
+        导出抓包记录
+        :param chunks: (时间戳, 原始字节)
+        """
+        for ts, data in chunks:
+            self.consume(con, data, ts)
+
+    def _flush_table(self, table: Table) -> None:
+        path = table.flush(self.directory, self.npz)
+        if path is not None:
+            self.written.append(path)
+
+    def flush(self) -> None:
+        for table in self.tables.values():
+            self._flush_table(table)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
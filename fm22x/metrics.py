@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import math
+
+
+class LatencyHistogram:
+    """
+    对数分桶的延迟直方图，内存占用与样本数无关，分位数相对误差不超过 precision
+    """
+
+    def __init__(self, precision: float = 0.01, lowest: float = 1e-6):
+        """
+
+        :param precision: 分位数的相对误差
+        :param lowest: 可分辨的最小值（秒），更小的值计入第一个桶
+        """
+        self.precision = precision
+        self.lowest = lowest
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._log_base = math.log1p(2 * precision)
+        self._buckets: dict[int, int] = {}
+
+    def record(self, value: float) -> None:
+        index = 0
+        if value > self.lowest:
+            index = int(math.log(value / self.lowest) / self._log_base)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: LatencyHistogram) -> None:
+        if other._log_base != self._log_base or other.lowest != self.lowest:
+            raise ValueError("Incompatible histogram")
+        for index, n in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: 0-100
+        :return: 分位数，没有样本时为 nan
+        """
+        if not self.count:
+            return math.nan
+        rank = max(1, math.ceil(self.count * p / 100))
+        if rank >= self.count:
+            return self.max
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                # 桶中点
+                value = self.lowest * math.exp((index + 0.5) * self._log_base)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
+    def summary(self, scale: float = 1000.0, unit: str = "ms") -> str:
+        if not self.count:
+            return "n=0"
+        return (
+            f"n={self.count} p50={self.p50 * scale:.2f}{unit} "
+            f"p99={self.p99 * scale:.2f}{unit} max={self.max * scale:.2f}{unit}"
+        )
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import struct
 from enum import IntEnum
-from typing import Self
+from typing import NamedTuple
 
 
 class NID(IntEnum):
@@ -29,6 +32,48 @@ class FaceState(IntEnum):
     UNKNOW_STATUS = 14
 
 
+_FACE_STATES = {int(state): state for state in FaceState}
+_FACE = struct.Struct(">H4H3h")  # state, left, top, right, bottom, yaw, pitch, roll
+FACE_SIZE = _FACE.size
+
+
+class FaceInfo(NamedTuple):
+    """
+    NidFaceState 的负载，姿态角为有符号数
+    """
+
+    state: int  # 原始值，可能不在 FaceState 中，用 face_state 转换
+    left: int
+    top: int
+    right: int
+    bottom: int
+    yaw: int
+    pitch: int
+    roll: int
+
+
+def face_state(code: int) -> FaceState:
+    """
+    :return: 未知的状态码返回 FaceState.UNKNOW_STATUS
+    """
+    return _FACE_STATES.get(code, FaceState.UNKNOW_STATUS)
+
+
+def decode_face(data: bytes, offset: int = 0) -> FaceInfo:
+    """
+    解析 NidFaceState 的负载
+    :param offset: 负载在 data 中的起始位置
+    :raise ValueError: 长度不足 FACE_SIZE
+    """
+    if len(data) - offset < FACE_SIZE:
+        raise ValueError("Face note too short")
+    return FaceInfo._make(_FACE.unpack_from(data, offset))
+
+
+def encode_face(info: FaceInfo) -> bytes:
+    return _FACE.pack(*info)
+
+
 class NoteMeta(type):
     register_types: dict[int | NID, type["Note"]] = {}
 
@@ -61,35 +106,44 @@ class NidFaceState(Note):
 
     @property
     def state(self) -> FaceState:
-        return FaceState(int.from_bytes(self.data[:2], "big"))
+        if len(self.data) < 2:
+            return FaceState.UNKNOW_STATUS
+        return face_state(int.from_bytes(self.data[:2], "big"))
+
+    @property
+    def face(self) -> FaceInfo:
+        """
+        :raise ValueError: note 不完整
+        """
+        return decode_face(self.data)
 
     @property
     def left(self):
-        return int.from_bytes(self.data[2:4], "big")
+        return self.face.left
 
     @property
     def top(self):
-        return int.from_bytes(self.data[4:6], "big")
+        return self.face.top
 
     @property
     def right(self):
-        return int.from_bytes(self.data[6:8], "big")
+        return self.face.right
 
     @property
     def bottom(self):
-        return int.from_bytes(self.data[8:10], "big")
+        return self.face.bottom
 
     @property
     def yaw(self):
-        return int.from_bytes(self.data[10:12], "big")
+        return self.face.yaw
 
     @property
     def pitch(self):
-        return int.from_bytes(self.data[12:14], "big")
+        return self.face.pitch
 
     @property
     def roll(self):
-        return int.from_bytes(self.data[14:16], "big")
+        return self.face.roll
 
 
 class NidUnknownError(Note):
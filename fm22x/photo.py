@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+照片注册前的预检：只解析 JPEG 段头（不解码像素），在占用串口之前拒绝模组会拒绝的照片
+
+模组在收完全部 MidEnrollWithPhoto 分包后才会返回 FAILED4_JPGPHOTO_LARGE/SMALL，
+一张被拒的照片浪费整次传输。
+"""
+from __future__ import annotations
+
+import hashlib
+import struct
+from collections import OrderedDict
+from typing import Iterator, NamedTuple
+
+from fm22x.response import MsgResultCode
+
+_SOF = frozenset(
+    (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+)
+_PROGRESSIVE = frozenset((0xC2, 0xC6, 0xCA, 0xCE))
+_STANDALONE = frozenset((0x01, *range(0xD0, 0xD8)))
+_SOS = 0xDA
+_EOI = 0xD9
+# APP1-APP13、APP15 和 COM：EXIF、XMP、ICC、缩略图、注释等，去掉不影响解码
+# 保留 APP0（JFIF）和 APP14（Adobe，决定颜色变换）
+_METADATA = frozenset((*range(0xE1, 0xEE), 0xEF, 0xFE))
+_SOF_FIELDS = struct.Struct(">BHHB")  # 精度, 高, 宽, 分量数
+
+
+class PhotoInfo(NamedTuple):
+    width: int
+    height: int
+    components: int  # 1 为灰度，3 为 YCbCr
+    progressive: bool
+    size: int  # 字节数
+    metadata: int  # 可以去掉的元数据字节数
+
+
+class PhotoLimits(NamedTuple):
+    """
+    模组可接受的照片范围，默认值为经验值，应按固件说明调整
+    """
+
+    min_width: int = 160
+    min_height: int = 160
+    max_width: int = 1920
+    max_height: int = 1920
+    max_size: int = 256 * 1024
+    allow_progressive: bool = False  # 模组的解码器一般只支持 baseline
+
+
+class PreflightResult(NamedTuple):
+    result: MsgResultCode  # SUCCESS 或模组会返回的错误
+    info: PhotoInfo | None  # 无法解析时为 None
+    photo: bytes  # 去掉元数据后的照片，不通过时为原照片
+    digest: bytes  # 原照片的 sha256
+
+
+def _segments(data: bytes) -> Iterator[tuple[int, int, int]]:
+    """
+    依次返回 SOI 之后各段的 (marker, 段起始, 段结束)，SOS 段的结束为文件末尾
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Invalid jpeg")
+    pos = 2
+    end = len(data)
+    while True:
+        start = pos
+        if pos >= end or data[pos] != 0xFF:
+            raise ValueError("Invalid jpeg")
+        while pos < end and data[pos] == 0xFF:  # 填充字节
+            pos += 1
+        if pos >= end:
+            raise ValueError("Truncated jpeg")
+        marker = data[pos]
+        pos += 1
+        if marker in _STANDALONE:
+            yield marker, start, pos
+            continue
+        if marker == _EOI:
+            raise ValueError("No image data in jpeg")
+        if marker == _SOS:
+            yield marker, start, end
+            return
+        if pos + 2 > end:
+            raise ValueError("Truncated jpeg")
+        length = int.from_bytes(data[pos : pos + 2], "big")
+        if length < 2 or pos + length > end:
+            raise ValueError("Truncated jpeg")
+        pos += length
+        yield marker, start, pos
+
+
+def inspect_jpeg(data: bytes) -> PhotoInfo:
+    """
+    读取 SOF 中的尺寸和编码方式
+    :raise ValueError: 不是 JPEG 或数据不完整
+    """
+    sof = None
+    metadata = 0
+    for marker, start, end in _segments(data):
+        if marker in _SOF:
+            if end - start < 10:
+                raise ValueError("Truncated jpeg")
+            _, height, width, components = _SOF_FIELDS.unpack_from(data, start + 4)
+            sof = (width, height, components, marker in _PROGRESSIVE)
+        elif marker in _METADATA:
+            metadata += end - start
+    if sof is None:
+        raise ValueError("No SOF in jpeg")
+    width, height, components, progressive = sof
+    if not width or not height:
+        raise ValueError("Unsupported jpeg")  # 高度由 DNL 段给出
+    return PhotoInfo(width, height, components, progressive, len(data), metadata)
+
+
+def strip_metadata(data: bytes) -> bytes:
+    """
+    去掉 EXIF、XMP、ICC、注释等元数据段，图像数据不变
+    """
+    parts = [data[:2]]
+    for marker, start, end in _segments(data):
+        if marker not in _METADATA:
+            parts.append(data[start:end])
+    return b"".join(parts)
+
+
+def check_photo(info: PhotoInfo, limits: PhotoLimits = PhotoLimits()) -> MsgResultCode:
+    """
+    :return: SUCCESS 或模组会返回的错误码
+    """
+    if info.width > limits.max_width or info.height > limits.max_height:
+        return MsgResultCode.FAILED4_JPGPHOTO_LARGE
+    if info.size > limits.max_size:
+        return MsgResultCode.FAILED4_JPGPHOTO_LARGE
+    if info.width < limits.min_width or info.height < limits.min_height:
+        return MsgResultCode.FAILED4_JPGPHOTO_SMALL
+    if info.progressive and not limits.allow_progressive:
+        return MsgResultCode.FAILED4_INVALIDPARAM
+    return MsgResultCode.SUCCESS
+
+
+class Preflight:
+    """
+    批量预检，结果按照片内容的 sha256 缓存，同一张照片只解析一次。
+    缓存只保存结论，命中时按需重新去掉元数据，不保留照片内容
+    """
+
+    def __init__(
+        self,
+        limits: PhotoLimits = PhotoLimits(),
+        normalize: bool = True,
+        cache_size: int = 65536,
+    ):
+        """
+
+        :param limits: 模组可接受的照片范围
+        :param normalize: 是否去掉元数据以减少传输字节数
+        :param cache_size: 最多缓存的结果数
+        """
+        self.limits = limits
+        self.normalize = normalize
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        # sha256 -> (结论, 照片信息, 是否需要去掉元数据)
+        self._cache: OrderedDict[
+            bytes, tuple[MsgResultCode, PhotoInfo | None, bool]
+        ] = OrderedDict()
+
+    def check(self, photo: bytes) -> PreflightResult:
+        digest = hashlib.sha256(photo).digest()
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(digest)
+            result, info, strip = cached
+            return PreflightResult(
+                result, info, strip_metadata(photo) if strip else photo, digest
+            )
+        self.misses += 1
+        checked = self._check(photo, digest)
+        self._cache[digest] = (
+            checked.result,
+            checked.info,
+            checked.photo is not photo,
+        )
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return checked
+
+    def _check(self, photo: bytes, digest: bytes) -> PreflightResult:
+        try:
+            info = inspect_jpeg(photo)
+        except ValueError:
+            return PreflightResult(
+                MsgResultCode.FAILED4_INVALIDPARAM, None, photo, digest
+            )
+        if self.normalize and info.metadata:
+            stripped = strip_metadata(photo)
+            info = info._replace(size=len(stripped), metadata=0)
+        else:
+            stripped = photo
+        result = check_photo(info, self.limits)
+        return PreflightResult(
+            result,
+            info,
+            stripped if result == MsgResultCode.SUCCESS else photo,
+            digest,
+        )
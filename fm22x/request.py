@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations
+
 import functools
 import operator
+import struct
 from enum import IntEnum
 from typing import Literal
 
@@ -48,6 +51,7 @@ def calculate_checksum(data: bytes) -> int:
 
 
 SYNC_WORD = b"\xef\xaa"
+_HEADER = struct.Struct(">2sBH")
 
 
 class Request:
@@ -66,6 +70,26 @@ class Request:
         checksum = calculate_checksum(data)
         return data + checksum.to_bytes(1, "big")
 
+    def encode_into(self, buf: bytearray, offset: int = 0) -> int:
+        """
+        将数据帧直接写入预先分配好的缓冲区
+        :param buf: 目标缓冲区，长度至少为 offset + size + 6
+        :param offset: 写入起始位置
+        :return: 帧结束位置
+        """
+        assert self.command is not None, "Command not set"
+        data = self.data
+        size = len(data)
+        end = offset + size + 6
+        if len(buf) < end:
+            raise ValueError("Buffer too small")
+        _HEADER.pack_into(buf, offset, SYNC_WORD, self.command, size)
+        buf[offset + 5 : end - 1] = data
+        buf[end - 1] = functools.reduce(
+            operator.xor, data, self.command ^ (size >> 8) ^ (size & 0xFF)
+        )
+        return end
+
     @property
     def size(self):
         return len(self.data)
@@ -256,6 +280,7 @@ class InitEncryption(Request):
 
         :param seed: 随机种子
         """
+        self.seed = seed
         self.data = seed.to_bytes(4, "big")
 
 
@@ -267,6 +292,7 @@ class MidSetReleaseEncKey(Request):
 
         :param enc_key_number: 加密序列
         """
+        self.enc_key_number = enc_key_number
         self.data = enc_key_number
 
 
@@ -278,6 +304,7 @@ class MidSetDebugEncKey(Request):
 
         :param enc_key_number: 加密序列
         """
+        self.enc_key_number = enc_key_number
         self.data = enc_key_number
 
 
@@ -347,3 +374,21 @@ class DemoMode(Request):
 
     def __init__(self, enable: bool):
         self.data = int(enable).to_bytes(1, "big")
+
+
+def raw_request(command: int | Command, data: bytes) -> Request:
+    """
+    由命令字和负载还原请求，用于跨进程转发等场景，不会还原构造参数对应的属性
+    :param command: 命令字
+    :param data: 负载
+    """
+    cls = _request_types().get(command, Request)
+    req = cls.__new__(cls)
+    req.command = Command(command)
+    req.data = bytes(data)
+    return req
+
+
+@functools.lru_cache(maxsize=None)
+def _request_types() -> dict[int, type[Request]]:
+    return {cls.command: cls for cls in Request.__subclasses__()}  # type: ignore
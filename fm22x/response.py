@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations
+
 from enum import IntEnum
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from fm22x.request import Request
 
 
 class MID(IntEnum):
@@ -60,6 +65,8 @@ class MsgResultCode(IntEnum):
 
 
 class Response(metaclass=ResponseMeta):
+    request: Request | None = None  # 由 Connection 关联的对应请求
+
     def __init__(self, mid: MID | int, result: MsgResultCode | int, data: bytes):
 
         self.mid = MID(mid)
@@ -351,6 +358,13 @@ class MidEnrollWithPhoto(Response):
         """
         return int.from_bytes(self.data[:2], "big")
 
+    @property
+    def user_id(self) -> int:
+        """
+        最后一包的回复中为模组分配的用户ID
+        """
+        return int.from_bytes(self.data[2:4], "big")
+
 
 class MidDemoMode(Response):
     mid = MID.MID_DEMOMODE
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+基于 multiprocessing.shared_memory 的事件总线：
+持有串口的进程把帧写入定长记录环形缓冲区，其他进程轮询读取，并通过各自的命令槽回传请求
+
+布局::
+
+    [0, 128)              头部，write_seq 位于 64
+    [128, +cap*rs)        事件记录: seq Q | ts d | msg_id B | length H | payload
+    之后每个命令槽         head Q | tail Q | 命令记录: command B | length H | data
+
+写入者先把记录的 seq 清零，写完内容后再写入 seq，读取者在拷贝前后各检查一次 seq。
+各方只由单一进程写入（事件环由持有者，命令槽 head 由对应读取者，tail 由持有者）
+
+EventBusReader.wait 用于阻塞等待：读取者绑定一个 Unix 数据报套接字作为唤醒位，
+写入者每次写入后向所有唤醒位各发一个字节，未绑定的地址直接失败
+"""
+from __future__ import annotations
+
+import os
+import select
+import socket
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Iterator
+
+from fm22x.note import Note
+from fm22x.request import Request, raw_request
+from fm22x.response import Response
+
+if TYPE_CHECKING:
+    from fm22x.connection import Connection
+
+MAGIC = b"FMEB"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sB3xIIIIII")
+_RECORD = struct.Struct("<QdBH")
+_CMD = struct.Struct("<BH")
+_SEQ = struct.Struct("<Q")
+
+_WRITE_SEQ = 64
+_EVENTS = 128
+_SLOT_HEADER = 16
+
+
+class _Layout:
+    def __init__(
+        self,
+        capacity: int,
+        record_size: int,
+        command_slots: int,
+        command_capacity: int,
+        command_size: int,
+        waiters: int,
+    ):
+        if record_size <= _RECORD.size or command_size <= _CMD.size:
+            raise ValueError("Record size too small")
+        self.capacity = capacity
+        self.record_size = record_size
+        self.command_slots = command_slots
+        self.command_capacity = command_capacity
+        self.command_size = command_size
+        self.waiters = waiters
+        self.commands = _EVENTS + capacity * record_size
+        self.slot_size = _SLOT_HEADER + command_capacity * command_size
+        self.size = self.commands + command_slots * self.slot_size
+
+    @classmethod
+    def read(cls, buf: memoryview) -> _Layout:
+        magic, version, *fields = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Invalid event bus")
+        return cls(*fields)
+
+    def write(self, buf: memoryview) -> None:
+        _HEADER.pack_into(
+            buf,
+            0,
+            MAGIC,
+            VERSION,
+            self.capacity,
+            self.record_size,
+            self.command_slots,
+            self.command_capacity,
+            self.command_size,
+            self.waiters,
+        )
+
+    def slot(self, index: int) -> int:
+        if not 0 <= index < self.command_slots:
+            raise ValueError("Invalid command slot")
+        return self.commands + index * self.slot_size
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    打开已有的共享内存，不登记到 resource_tracker，读取端退出时不应删除共享内存
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    if os.name != "posix":
+        return shared_memory.SharedMemory(name=name)
+    from multiprocessing import resource_tracker
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None  # type: ignore
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+_CAN_WAIT = hasattr(socket, "AF_UNIX")
+
+
+def _wake_address(name: str, index: int) -> str:
+    """
+    第 index 个唤醒位的地址，Linux 上使用抽象命名空间，不产生文件
+    """
+    name = f"fm22x-{name.replace('/', '_')}.{index}"
+    if sys.platform.startswith("linux"):
+        return "\0" + name
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+class EventBus:
+    """
+    持有设备的一端
+    """
+
+    def __init__(
+        self,
+        name: str | None = None,
+        capacity: int = 1024,
+        record_size: int = 96,
+        command_slots: int = 4,
+        command_capacity: int = 16,
+        command_size: int = 4104,
+        waiters: int = 4,
+    ):
+        """
+
+        :param name: 共享内存名称，None 则自动生成
+        :param capacity: 事件记录数
+        :param record_size: 每条事件记录的字节数，负载超出部分会被截断
+        :param command_slots: 命令槽数量，每个读取者独占一个
+        :param command_capacity: 每个命令槽可缓存的命令数
+        :param command_size: 每条命令记录的字节数
+        :param waiters: 可以同时调用 EventBusReader.wait 的读取者数量
+        """
+        self.layout = _Layout(
+            capacity,
+            record_size,
+            command_slots,
+            command_capacity,
+            command_size,
+            waiters,
+        )
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=self.layout.size
+        )
+        self._buf = self._shm.buf
+        self.layout.write(self._buf)
+        self._seq = 0
+        self._wake = None
+        self._wake_addresses: list[str] = []
+        if _CAN_WAIT and waiters:
+            self._wake = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._wake.setblocking(False)
+            self._wake_addresses = [_wake_address(self.name, i) for i in range(waiters)]
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def publish(
+        self, msg_id: int, payload: bytes, ts: float | None = None, notify: bool = True
+    ) -> int:
+        """
+        写入一帧
+        :param msg_id: 0 为 reply，1 为 note
+        :param payload: 以 mid/nid 开头的负载
+        :param notify: 是否唤醒等待中的读取者，批量写入时可以只在最后调用 notify
+        :return: 序号
+        """
+        layout = self.layout
+        buf = self._buf
+        seq = self._seq + 1
+        off = _EVENTS + ((seq - 1) % layout.capacity) * layout.record_size
+        length = len(payload)
+        stored = min(length, layout.record_size - _RECORD.size)
+        _RECORD.pack_into(
+            buf, off, 0, time.time() if ts is None else ts, msg_id, length
+        )
+        start = off + _RECORD.size
+        buf[start : start + stored] = memoryview(payload)[:stored]
+        _SEQ.pack_into(buf, off, seq)
+        _SEQ.pack_into(buf, _WRITE_SEQ, seq)
+        self._seq = seq
+        if notify:
+            self.notify()
+        return seq
+
+    def notify(self) -> None:
+        """
+        唤醒调用 wait 的读取者
+        """
+        wake = self._wake
+        if wake is None:
+            return
+        for address in self._wake_addresses:
+            try:
+                wake.sendto(b"\x00", address)
+            except OSError:
+                pass  # 没有读取者绑定，或读取者还有未处理的唤醒
+
+    def pump(self, con: Connection, data: bytes, ts: float | None = None) -> int:
+        """
+        从串口数据中分帧并全部写入
+        :return: 写入的帧数
+        """
+        count = 0
+        for msg_id, payload in con.receive_frames(data):
+            self.publish(msg_id, payload, ts, notify=False)
+            count += 1
+        if count:
+            self.notify()
+        return count
+
+    def commands(self) -> list[Request]:
+        """
+        取出所有读取者回传的请求
+        """
+        layout = self.layout
+        buf = self._buf
+        reqs = []
+        for index in range(layout.command_slots):
+            base = layout.slot(index)
+            head = _SEQ.unpack_from(buf, base)[0]
+            tail = _SEQ.unpack_from(buf, base + 8)[0]
+            while tail < head:
+                off = base + _SLOT_HEADER + (tail % layout.command_capacity) * layout.command_size
+                command, length = _CMD.unpack_from(buf, off)
+                start = off + _CMD.size
+                reqs.append(raw_request(command, buf[start : start + length]))
+                tail += 1
+            _SEQ.pack_into(buf, base + 8, tail)
+        return reqs
+
+    def close(self) -> None:
+        if self._wake is not None:
+            self._wake.close()
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class EventBusReader:
+    """
+    读取端，可以在任意进程中按名称打开
+    """
+
+    def __init__(self, name: str, slot: int | None = None, from_start: bool = False):
+        """
+
+        :param name: EventBus.name
+        :param slot: 独占的命令槽，None 则不能回传命令
+        :param from_start: True 则从环中最早的记录开始读，否则只读之后的新记录
+        """
+        self._shm = _attach(name)
+        self._buf = self._shm.buf
+        self.layout = _Layout.read(self._buf)
+        self._slot = None if slot is None else self.layout.slot(slot)
+        head = _SEQ.unpack_from(self._buf, _WRITE_SEQ)[0]
+        self._next = max(1, head - self.layout.capacity + 1) if from_start else head + 1
+        self.dropped = 0  # 被覆盖而丢失的记录
+        self.truncated = 0  # 超出记录长度而无法解码的帧
+        self.invalid = 0  # 解码失败而跳过的帧
+        self._name = name
+        self._wake: socket.socket | None = None
+        self._wake_address: str | None = None
+
+    def _pending(self) -> int:
+        head = _SEQ.unpack_from(self._buf, _WRITE_SEQ)[0]
+        oldest = head - self.layout.capacity + 1
+        if self._next < oldest:
+            self.dropped += oldest - self._next
+            self._next = oldest
+        return head
+
+    def _bind(self) -> socket.socket:
+        """
+        占用一个空闲的唤醒位
+        """
+        if not _CAN_WAIT:
+            raise ValueError("wait is not supported on this platform")
+        for index in range(self.layout.waiters):
+            address = _wake_address(self._name, index)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sock.bind(address)
+            except OSError:
+                sock.close()
+                continue
+            sock.setblocking(False)
+            self._wake = sock
+            self._wake_address = address
+            return sock
+        raise ValueError("No free waiter slot")
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        阻塞直到有新记录，之后用 poll/poll_raw 读取
+        :param timeout: 秒，None 则一直等待
+        :return: 是否有新记录，超时返回 False
+        """
+        sock = self._wake or self._bind()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # 先清空唤醒再检查，检查之后的写入一定会留下新的唤醒
+            try:
+                while sock.recv(64):
+                    pass
+            except BlockingIOError:
+                pass
+            if _SEQ.unpack_from(self._buf, _WRITE_SEQ)[0] >= self._next:
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            select.select([sock], [], [], remaining)
+
+    def poll_raw(self) -> Iterator[tuple[int, float, int, int, memoryview]]:
+        """
+        零拷贝读取新记录
+        :return: (seq, ts, msg_id, 原始长度, 负载视图)，视图在写入者绕回覆盖前有效，需要保留请自行拷贝
+        """
+        layout = self.layout
+        buf = self._buf
+        room = layout.record_size - _RECORD.size
+        head = self._pending()
+        while self._next <= head:
+            seq = self._next
+            off = _EVENTS + ((seq - 1) % layout.capacity) * layout.record_size
+            stored_seq, ts, msg_id, length = _RECORD.unpack_from(buf, off)
+            self._next += 1
+            if stored_seq != seq:
+                self.dropped += 1
+                continue
+            start = off + _RECORD.size
+            yield seq, ts, msg_id, length, buf[start : start + min(length, room)]
+
+    def poll(self) -> list[tuple[float, Response | Note]]:
+        """
+        读取并解码新记录，解码失败的记录计入 invalid 并跳过
+        :return: (ts, 事件)
+        """
+        layout = self.layout
+        buf = self._buf
+        room = layout.record_size - _RECORD.size
+        events = []
+        for seq, ts, msg_id, length, view in self.poll_raw():
+            payload = bytes(view)
+            view.release()
+            off = _EVENTS + ((seq - 1) % layout.capacity) * layout.record_size
+            if _SEQ.unpack_from(buf, off)[0] != seq:  # 拷贝期间被覆盖
+                self.dropped += 1
+                continue
+            if length > room:
+                self.truncated += 1
+                continue
+            try:
+                if msg_id == 0x00:
+                    events.append((ts, Response.decode(payload)))
+                else:
+                    events.append((ts, Note.decode(payload)))
+            except (ValueError, IndexError):
+                self.invalid += 1
+        return events
+
+    def send(self, req: Request) -> None:
+        """
+        把请求回传给持有设备的进程
+        """
+        if self._slot is None:
+            raise ValueError("No command slot")
+        layout = self.layout
+        buf = self._buf
+        base = self._slot
+        head = _SEQ.unpack_from(buf, base)[0]
+        tail = _SEQ.unpack_from(buf, base + 8)[0]
+        if head - tail >= layout.command_capacity:
+            raise ValueError("Command ring full")
+        data = req.data
+        if len(data) > layout.command_size - _CMD.size:
+            raise ValueError("Command too large")
+        off = base + _SLOT_HEADER + (head % layout.command_capacity) * layout.command_size
+        _CMD.pack_into(buf, off, req.command, len(data))
+        start = off + _CMD.size
+        buf[start : start + len(data)] = data
+        _SEQ.pack_into(buf, base, head + 1)
+
+    def close(self) -> None:
+        if self._wake is not None:
+            self._wake.close()
+            if not self._wake_address.startswith("\0"):  # type: ignore
+                os.unlink(self._wake_address)  # type: ignore
+            self._wake = None
+        self._buf = None
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
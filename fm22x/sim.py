@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+模拟的 FM22X 模组，用于压力测试：输入主机发出的字节，返回模组应答的字节
+
+    dev = VirtualDevice(users={1: "alice"}, face_notes=3)
+    serial.write(dev.feed(serial.read()))
+
+可以注入线路噪声（帧间随机字节）和损坏的帧（翻转一个字节），见 bench/soak.py
+"""
+from __future__ import annotations
+
+import random
+
+from fm22x.note import NID, FaceInfo, FaceState, encode_face
+from fm22x.request import SYNC_WORD, Command, calculate_checksum
+from fm22x.response import MID, MsgResultCode, ResponseMeta, Status
+
+
+def encode_frame(msg_id: int, payload: bytes) -> bytes:
+    """
+    编码模组发出的一帧
+    :param msg_id: 0 为 reply，1 为 note
+    :param payload: 以 mid/nid 开头的负载
+    """
+    frame = bytearray(SYNC_WORD)
+    frame.append(msg_id)
+    frame += len(payload).to_bytes(2, "big")
+    frame += payload
+    frame.append(calculate_checksum(frame))
+    return bytes(frame)
+
+
+class VirtualDevice:
+    def __init__(
+        self,
+        users: dict[int, str] | None = None,
+        face_notes: int = 0,
+        fail_rate: float = 0.0,
+        noise: float = 0.0,
+        corrupt: float = 0.0,
+        seed: int | None = None,
+    ):
+        """
+
+        :param users: 已注册用户 {user_id: user_name}
+        :param face_notes: 每次 Verify 在结果前发出的 NidFaceState 数量
+        :param fail_rate: Verify 失败（活体检测不通过）的概率
+        :param noise: 每帧之前插入 1-16 个随机字节的概率
+        :param corrupt: 每帧被翻转一个字节的概率
+        :param seed: 随机数种子
+        """
+        self.users = dict(users or {})
+        self.face_notes = face_notes
+        self.fail_rate = fail_rate
+        self.noise = noise
+        self.corrupt = corrupt
+        self.random = random.Random(seed)
+
+        self.buffer = bytearray()
+        self.requests = 0  # 收到的请求数
+        self.errors = 0  # 校验失败或无法识别的请求数
+        self.frames = 0  # 发出的帧数
+        self.noise_bytes = 0  # 注入的噪声字节数
+        self.corrupted = 0  # 被损坏的帧数
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        :param data: 主机发出的原始字节
+        :return: 需要写回主机的字节
+        """
+        buf = self.buffer
+        buf.extend(data)
+        out = bytearray()
+        while True:
+            start = buf.find(SYNC_WORD)
+            if start < 0:
+                # 末尾可能是半个同步字
+                del buf[: len(buf) - 1 if buf.endswith(SYNC_WORD[:1]) else len(buf)]
+                break
+            del buf[:start]
+            if len(buf) < 5:
+                break
+            size = int.from_bytes(buf[3:5], "big")
+            if len(buf) < size + 6:
+                break
+            if buf[size + 5] != calculate_checksum(buf[: size + 5]):
+                self.errors += 1
+                del buf[:2]
+                continue
+            command = buf[2]
+            payload = bytes(buf[5 : 5 + size])
+            del buf[: size + 6]
+            self.requests += 1
+            for msg_id, frame in self.handle(command, payload):
+                out += self._emit(msg_id, frame)
+        return bytes(out)
+
+    def _emit(self, msg_id: int, payload: bytes) -> bytes:
+        rnd = self.random
+        frame = encode_frame(msg_id, payload)
+        self.frames += 1
+        if self.corrupt and rnd.random() < self.corrupt:
+            damaged = bytearray(frame)
+            damaged[rnd.randrange(len(damaged))] ^= 1 << rnd.randrange(8)
+            frame = bytes(damaged)
+            self.corrupted += 1
+        if self.noise and rnd.random() < self.noise:
+            n = rnd.randint(1, 16)
+            # 与 Random.randbytes 结果相同，后者需要 Python 3.9
+            garbage = rnd.getrandbits(8 * n).to_bytes(n, "little")
+            self.noise_bytes += len(garbage)
+            frame = garbage + frame
+        return frame
+
+    def _reply(
+        self, mid: int, result: MsgResultCode = MsgResultCode.SUCCESS, data: bytes = b""
+    ) -> tuple[int, bytes]:
+        return 0x00, bytes((mid, result)) + data
+
+    def _face(self) -> tuple[int, bytes]:
+        rnd = self.random
+        left = rnd.randint(80, 120)
+        top = rnd.randint(80, 120)
+        return 0x01, bytes((NID.FACE_STATE,)) + encode_face(
+            FaceInfo(
+                FaceState.NORMAL,
+                left,
+                top,
+                left + 100,
+                top + 100,
+                rnd.randint(-10, 10),
+                rnd.randint(-10, 10),
+                rnd.randint(-10, 10),
+            )
+        )
+
+    def handle(self, command: int, data: bytes) -> list[tuple[int, bytes]]:
+        """
+        :return: 依次发出的 (msg_id, 负载)
+        """
+        if command == Command.RESET:
+            return [self._reply(MID.MID_RESET)]
+        if command == Command.GET_STATUS:
+            return [self._reply(MID.MID_GETSTATUS, data=bytes((Status.IDLE,)))]
+        if command == Command.VERIFY:
+            frames = [self._face() for _ in range(self.face_notes)]
+            if not self.users:
+                frames.append(
+                    self._reply(MID.MID_VERIFY, MsgResultCode.FAILED4_UNKNOWNUSER)
+                )
+            elif self.fail_rate and self.random.random() < self.fail_rate:
+                frames.append(
+                    self._reply(MID.MID_VERIFY, MsgResultCode.FAILED4_LIVENESSCHECK)
+                )
+            else:
+                user_id = self.random.choice(list(self.users))
+                name = self.users[user_id].encode()[:32].ljust(32, b"\x00")
+                frames.append(
+                    self._reply(
+                        MID.MID_VERIFY,
+                        data=user_id.to_bytes(2, "big") + name + b"\x00\x01",
+                    )
+                )
+            return frames
+        if command == Command.GET_USER_INFO:
+            user_id = int.from_bytes(data[:2], "big")
+            if user_id not in self.users:
+                return [self._reply(MID.MID_GETUSERINFO, MsgResultCode.FAILED4_UNKNOWNUSER)]
+            name = self.users[user_id].encode()[:32].ljust(32, b"\x00")
+            return [
+                self._reply(
+                    MID.MID_GETUSERINFO, data=data[:2] + name + b"\x00"
+                )
+            ]
+        if command == Command.DELETE_USER:
+            user_id = int.from_bytes(data[:2], "big")
+            if self.users.pop(user_id, None) is None:
+                return [self._reply(MID.MID_DELUSER, MsgResultCode.FAILED4_UNKNOWNUSER)]
+            return [self._reply(MID.MID_DELUSER)]
+        if command == Command.DELETE_ALL:
+            self.users.clear()
+            return [self._reply(MID.MID_DELALL)]
+        if command in ResponseMeta.register_types:
+            return [self._reply(command, MsgResultCode.MR_REJECTED)]
+        self.errors += 1
+        return []
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+多台模组的用户同步：快照 -> 与期望状态比较 -> 只执行必要的删除和照片注册
+
+照片注册不能指定用户ID、名字和管理员标志，ID 由模组分配。因此按每台设备上次注册时
+模组返回的用户ID（FleetSync.enrolled）对应清单中的用户，并用照片摘要判断是否需要重新注册。
+没有记录的设备用户按快照中的名字和管理员标志认领（名字为空的不认领），认领后视为已注册
+当前照片；仍未对应的设备用户会被删除
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from typing import TYPE_CHECKING, Iterable, NamedTuple
+
+from fm22x.request import DeleteUser, GetUserInfo, MidEnrollWithPhoto, MidGetAllUserid
+from fm22x.response import MidEnrollWithPhoto as MidEnrollWithPhotoReply
+from fm22x.response import MidGetAllUserID, MidGetUserInfo, MsgResultCode, Response
+
+if TYPE_CHECKING:
+    from fm22x.photo import Preflight
+    from fm22x.type import Transport
+
+
+class SyncError(ValueError):
+    def __init__(self, device: str, response: Response):
+        super().__init__(
+            f"{device}: {response.mid.name} failed with {response.result.name}"
+        )
+        self.device = device
+        self.response = response
+
+
+class UserRecord(NamedTuple):
+    user_id: int
+    user_name: str
+    admin: bool
+
+
+class DesiredUser(NamedTuple):
+    user_id: int
+    user_name: str
+    admin: bool
+    photo: bytes  # jpeg
+
+
+class Enrollment(NamedTuple):
+    """
+    清单中的用户在某台设备上的注册记录
+    """
+
+    device_id: int  # 模组分配的用户ID
+    digest: bytes  # 注册时清单照片（预检前）的摘要
+
+
+def photo_digest(photo: bytes) -> bytes:
+    return hashlib.sha256(photo).digest()
+
+
+class SyncCosts(NamedTuple):
+    """
+    用于估算耗时的单次操作成本（秒）
+    """
+
+    delete: float = 0.05
+    delete_all: float = 0.5
+    enroll: float = 1.5  # 照片注册的模组处理时间
+    per_byte: float = 10 / 115200  # 串口传输，默认 115200 8N1
+
+    def enroll_cost(self, user: DesiredUser) -> float:
+        return self.enroll + len(user.photo) * self.per_byte
+
+
+def photo_requests(photo: bytes, chunk_size: int = 4000) -> list[MidEnrollWithPhoto]:
+    """
+    按 chunk_size 切分照片，seq 从 0 开始
+    """
+    return [
+        MidEnrollWithPhoto(seq, photo[offset : offset + chunk_size])
+        for seq, offset in enumerate(range(0, len(photo), chunk_size))
+    ]
+
+
+class SyncPlan:
+    def __init__(
+        self,
+        device: str,
+        current: dict[int, UserRecord],
+        desired: dict[int, DesiredUser],
+        rejected: Iterable[int] = (),
+        enrolled: dict[int, Enrollment] | None = None,
+        digests: dict[int, bytes] | None = None,
+    ):
+        """
+        比较设备快照和期望状态
+        :param device: 设备名
+        :param current: 设备上的用户，以模组的用户ID为键
+        :param desired: 期望的用户，以清单中的用户ID为键
+        :param rejected: 照片未通过预检的用户，设备上已有的保持不动，没有的不注册
+        :param enrolled: 清单用户ID -> 该设备上的注册记录，apply 会更新
+        :param digests: 清单用户ID -> 照片摘要，None 则按 photo_digest 计算
+        """
+        self.device = device
+        self.delete: list[int] = []  # 模组的用户ID
+        self.enroll: list[DesiredUser] = []
+        self.skipped: list[int] = []  # 因照片未通过预检而未处理的用户
+        self.adopt: dict[int, int] = {}  # 按名字认领的用户，清单用户ID -> 模组的用户ID
+        self.keep = 0
+        self.enrolled = {} if enrolled is None else enrolled
+        if digests is None:
+            digests = {
+                user_id: photo_digest(want.photo) for user_id, want in desired.items()
+            }
+        self.digests = digests
+        rejected = frozenset(rejected)
+        claimed = set()  # 保留的模组用户ID
+        kept = set()  # 保留的清单用户ID
+        unmatched = []  # 没有注册记录或记录已失效的清单用户
+        for user_id, want in desired.items():
+            entry = self.enrolled.get(user_id)
+            on_device = entry is not None and entry.device_id in current
+            if user_id in rejected:
+                self.skipped.append(user_id)
+            if not on_device:
+                unmatched.append(user_id)
+            elif user_id in rejected or entry.digest == digests[user_id]:  # type: ignore
+                claimed.add(entry.device_id)  # type: ignore
+                kept.add(user_id)
+        by_name: dict[tuple[str, bool], list[int]] = {}
+        for record in current.values():
+            if record.user_id not in claimed and record.user_name:
+                key = (record.user_name, record.admin)
+                by_name.setdefault(key, []).append(record.user_id)
+        for user_id in unmatched:
+            want = desired[user_id]
+            candidates = by_name.get((want.user_name, want.admin))
+            if candidates:
+                device_id = candidates.pop(0)
+                claimed.add(device_id)
+                kept.add(user_id)
+                if user_id not in rejected:
+                    self.adopt[user_id] = device_id
+        self.keep = len(kept)
+        self.enroll = [
+            want
+            for user_id, want in desired.items()
+            if user_id not in rejected and user_id not in kept
+        ]
+        self.delete = [user_id for user_id in current if user_id not in claimed]
+        self.current = frozenset(current)  # 快照中模组的用户ID
+        self.desired = desired
+        self._rejected = rejected
+
+    def __bool__(self):
+        return bool(self.delete or self.enroll)
+
+    def requests(self, chunk_size: int = 4000) -> list:
+        reqs: list = [DeleteUser(user_id) for user_id in self.delete]
+        for user in self.enroll:
+            reqs.extend(photo_requests(user.photo, chunk_size))
+        return reqs
+
+    def estimate(self, costs: SyncCosts) -> float:
+        return len(self.delete) * costs.delete + sum(
+            costs.enroll_cost(user) for user in self.enroll
+        )
+
+    def full_resync_estimate(self, costs: SyncCosts) -> float:
+        """
+        DeleteAll 后全部重新注册的估算耗时
+        """
+        return costs.delete_all + sum(
+            costs.enroll_cost(user)
+            for user_id, user in self.desired.items()
+            if user_id not in self._rejected
+        )
+
+
+class DeviceReport:
+    def __init__(self, plan: SyncPlan, costs: SyncCosts):
+        self.plan = plan
+        self.estimated = plan.estimate(costs)
+        self.full_resync = plan.full_resync_estimate(costs)
+        self.elapsed: float | None = None  # dry run 时为 None
+
+    @property
+    def saved(self) -> float:
+        return self.full_resync - (
+            self.estimated if self.elapsed is None else self.elapsed
+        )
+
+
+class FleetReport:
+    def __init__(self):
+        self.devices: dict[str, DeviceReport] = {}
+        self.errors: dict[str, Exception] = {}
+        self.rejected: dict[int, MsgResultCode] = {}  # 照片未通过预检的用户
+        self.elapsed = 0.0
+
+    @property
+    def saved(self) -> float:
+        """
+        相比逐台全量重建节省的时间（秒）
+        """
+        return sum(report.saved for report in self.devices.values())
+
+    def summary(self) -> str:
+        lines = []
+        for name, report in self.devices.items():
+            plan = report.plan
+            lines.append(
+                f"{name}: keep {plan.keep}, delete {len(plan.delete)}, "
+                f"enroll {len(plan.enroll)}, saved {report.saved:.1f}s"
+            )
+        for name, exc in self.errors.items():
+            lines.append(f"{name}: error {exc}")
+        for user_id, result in self.rejected.items():
+            lines.append(f"user {user_id}: photo rejected, {result.name}")
+        lines.append(f"total saved {self.saved:.1f}s in {self.elapsed:.1f}s")
+        return "\n".join(lines)
+
+
+def _check(device: str, resp: Response) -> Response:
+    if resp.result != MsgResultCode.SUCCESS:
+        raise SyncError(device, resp)
+    return resp
+
+
+async def snapshot(device: str, transport: Transport) -> dict[int, UserRecord]:
+    """
+    读取设备上所有用户
+    """
+    resp = _check(device, await transport.call(MidGetAllUserid()))
+    assert isinstance(resp, MidGetAllUserID)
+    users = {}
+    for user_id in resp.user_id or ():
+        info = _check(device, await transport.call(GetUserInfo(user_id)))
+        assert isinstance(info, MidGetUserInfo)
+        users[user_id] = UserRecord(
+            user_id, info.user_name.rstrip("\x00"), bool(info.admin)
+        )
+    return users
+
+
+async def apply(
+    plan: SyncPlan, transport: Transport, chunk_size: int = 4000
+) -> None:
+    """
+    执行计划，并把认领的用户和每个用户最后一包照片的回复中模组分配的用户ID记入 plan.enrolled
+    """
+    enrolled = plan.enrolled
+    for user_id in plan.delete:
+        _check(plan.device, await transport.call(DeleteUser(user_id)))
+    remaining = plan.current.difference(plan.delete)
+    for user_id, entry in list(enrolled.items()):
+        if entry.device_id not in remaining:
+            del enrolled[user_id]
+    for user_id, device_id in plan.adopt.items():
+        enrolled[user_id] = Enrollment(device_id, plan.digests[user_id])
+    for user in plan.enroll:
+        resp = None
+        for req in photo_requests(user.photo, chunk_size):
+            resp = _check(plan.device, await transport.call(req))
+        if resp is not None:
+            assert isinstance(resp, MidEnrollWithPhotoReply)
+            enrolled[user.user_id] = Enrollment(resp.user_id, plan.digests[user.user_id])
+
+
+class FleetSync:
+    def __init__(
+        self,
+        manifest: Iterable[DesiredUser],
+        concurrency: int = 4,
+        costs: SyncCosts = SyncCosts(),
+        chunk_size: int = 4000,
+        preflight: Preflight | None = None,
+        enrolled: dict[str, dict[int, Enrollment]] | None = None,
+    ):
+        """
+
+        :param manifest: 期望的用户集合
+        :param concurrency: 同时同步的设备数上限
+        :param costs: 估算用的操作成本
+        :param chunk_size: 照片分包大小
+        :param preflight: 照片预检，通过的照片按预检结果替换（去掉元数据），
+                          未通过的不会传输
+        :param enrolled: 设备名 -> 清单用户ID -> 注册记录，即上次同步后的 self.enrolled，
+                         应持久化后传入，否则只能按名字认领，没有名字的设备用户会被重建
+        """
+        self.desired = {user.user_id: user for user in manifest}
+        self.rejected: dict[int, MsgResultCode] = {}
+        # 清单照片（预检前）的摘要，所有设备共用
+        self.digests: dict[int, bytes] = {}
+        for user_id, user in self.desired.items():
+            if preflight is None:
+                self.digests[user_id] = photo_digest(user.photo)
+                continue
+            checked = preflight.check(user.photo)
+            self.digests[user_id] = checked.digest
+            if checked.result == MsgResultCode.SUCCESS:
+                self.desired[user_id] = user._replace(photo=checked.photo)
+            else:
+                self.rejected[user_id] = checked.result
+        self.enrolled = {} if enrolled is None else enrolled
+        self.concurrency = concurrency
+        self.costs = costs
+        self.chunk_size = chunk_size
+
+    async def _sync_one(
+        self,
+        name: str,
+        transport: Transport,
+        sem: asyncio.Semaphore,
+        dry_run: bool,
+        report: FleetReport,
+    ) -> None:
+        async with sem:
+            try:
+                current = await snapshot(name, transport)
+                plan = SyncPlan(
+                    name,
+                    current,
+                    self.desired,
+                    self.rejected,
+                    self.enrolled.setdefault(name, {}),
+                    self.digests,
+                )
+                device = report.devices[name] = DeviceReport(plan, self.costs)
+                if dry_run:
+                    return
+                start = time.monotonic()
+                try:
+                    await apply(plan, transport, self.chunk_size)
+                finally:
+                    device.elapsed = time.monotonic() - start
+            except Exception as e:
+                report.errors[name] = e
+
+    async def run(
+        self, devices: dict[str, Transport], dry_run: bool = False
+    ) -> FleetReport:
+        """
+        并发同步所有设备，单台失败不影响其他设备
+        :param devices: 设备名 -> 通道
+        :param dry_run: 只生成计划，不做修改
+        """
+        report = FleetReport()
+        report.rejected = dict(self.rejected)
+        sem = asyncio.Semaphore(self.concurrency)
+        start = time.monotonic()
+        await asyncio.gather(
+            *(
+                self._sync_one(name, transport, sem, dry_run, report)
+                for name, transport in devices.items()
+            )
+        )
+        report.elapsed = time.monotonic() - start
+        return report
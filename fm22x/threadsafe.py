@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+可在多个线程间共享的 Connection，适用于 free-threaded（无 GIL）的 CPython 3.13+
+
+    con = ThreadSafeConnection()
+    # 读线程
+    con.feed(serial.read())
+    # 任意线程
+    serial.write(con.send(Verify(False, 5)))
+    for ev in con.events(timeout=1):
+        ...
+
+分帧、解密状态和 pending 由一把锁保护，锁内只做分帧、校验和请求匹配；
+完整的帧连同对应的请求放入 deque（append/popleft 本身是线程安全的）交给取事件的线程，在锁外构造 Response/Note。
+只有 deque 为空需要等待时才用到 Condition。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, Tuple
+
+from fm22x.connection import Connection
+from fm22x.note import Note
+from fm22x.request import Request
+from fm22x.response import Response
+
+if TYPE_CHECKING:
+    from fm22x.crypto import Cipher
+
+_Frame = Tuple[int, bytearray, Optional[Request]]  # msg_id, 负载, 对应的请求
+
+
+class ThreadSafeConnection(Connection):
+    """
+    并发约定：
+
+    - send/send_many/feed/receive_frames/resync/cancel/expire/snapshot 可以在任意线程调用，互相之间串行执行
+    - 每个完整的帧只会被一个线程取到（events/get/receive），帧的先后顺序在多个取事件的线程之间不保证
+    - 同一命令字的多个请求按发送顺序与回复对应，对应关系在 feed 中确定
+    - Tracer 只记录 encode 阶段
+    """
+
+    def __init__(
+        self,
+        cipher: Cipher | None = None,
+        cipher_factory: Callable[[int, bytes, bytes], Cipher] | None = None,
+    ):
+        super().__init__(cipher, cipher_factory)
+        self.frames: deque[_Frame] = deque()  # 待构造的帧
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(threading.Lock())
+
+    def send(self, req: Request) -> bytes:
+        """
+        加密模式下返回拷贝，发送缓冲区会被其他线程的 send 复用
+        """
+        with self._lock:
+            return bytes(super().send(req))
+
+    def send_many(
+        self, reqs: Iterable[Request], vectored: bool = False
+    ) -> bytearray | list[memoryview]:
+        reqs = list(reqs)
+        with self._lock:
+            return super().send_many(reqs, vectored)
+
+    def feed(self, data: bytes) -> int:
+        """
+        分帧后放入 frames，不构造 Response/Note
+        :param data: 收到的原始字节
+        :return: 放入的帧数
+        """
+        count = 0
+        frames = self.frames
+        with self._lock:
+            for msg_id, payload in super().receive_frames(data):
+                frames.append(
+                    (msg_id, payload, self.last_request if msg_id == 0x00 else None)
+                )
+                count += 1
+        if count:
+            with self._ready:
+                self._ready.notify_all()
+        return count
+
+    def receive_frames(self, data: bytes) -> Iterator[tuple[int, bytearray]]:
+        """
+        每次在锁内分出一帧，锁外产出，供 Dispatcher/ColumnarExporter/EventBus 使用。
+        产出后 last_request 可能已被其他线程改变，需要对应请求时用 feed/events
+        """
+        frames = super().receive_frames
+        while True:
+            with self._lock:
+                # 帧在产出前已从缓冲区移除，丢弃生成器不会影响状态
+                frame = next(frames(data), None)
+            if frame is None:
+                return
+            data = b""
+            yield frame
+
+    def decode(self, frame: _Frame) -> Response | Note:
+        """
+        构造 frames 中的一帧，可以在多个线程并行调用
+        """
+        msg_id, payload, request = frame
+        if msg_id == 0x00:
+            d = Response.decode(payload)
+            d.request = request
+            return d
+        return Note.decode(payload)
+
+    def _pop(self, timeout: float | None) -> _Frame | None:
+        """
+        :return: 超时返回 None
+        """
+        frames = self.frames
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return frames.popleft()
+            except IndexError:
+                pass
+            with self._ready:
+                if frames:
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._ready.wait(remaining)
+
+    def get(self, timeout: float | None = None) -> Response | Note:
+        """
+        取出并构造一帧
+        :param timeout: None 则一直等待
+        :raise TimeoutError: 超时
+        """
+        frame = self._pop(timeout)
+        if frame is None:
+            raise TimeoutError("No frame received")
+        return self.decode(frame)
+
+    def events(self, timeout: float = 0.0) -> Iterator[Response | Note]:
+        """
+        取出已收到的所有帧，frames 为空后再等待 timeout 秒
+        :param timeout: 0 则不等待
+        """
+        while True:
+            frame = self._pop(timeout)
+            if frame is None:
+                return
+            yield self.decode(frame)
+
+    def receive(self, data: bytes) -> Iterable[Response | Note]:
+        """
+        feed 后取出所有帧，可能包含其他线程 feed 的帧
+        """
+        self.feed(data)
+        return self.events()
+
+    def resync(self) -> int:
+        with self._lock:
+            return super().resync()
+
+    def cancel(self, req: Request) -> bool:
+        with self._lock:
+            return super().cancel(req)
+
+    def expire(self, older_than: float, now: float | None = None) -> list[Request]:
+        with self._lock:
+            return super().expire(older_than, now)
+
+    def snapshot(self) -> bytes:
+        """
+        不包含 frames 中尚未取出的帧，交接前应先取完
+        """
+        with self._lock:
+            return super().snapshot()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+按事务记录收发各阶段耗时，导出为 Chrome trace-event JSON（chrome://tracing 或 Perfetto 打开）
+
+    con.tracer = tracer = Tracer()
+    ...
+    tracer.dump("fm22x.trace.json")
+
+阶段：encode（编码请求）、write（由使用者通过 span() 标记）、device（发送完成到回复首字节）、
+receive（首字节到末字节）、frame（校验和解密）、decode（构造 Response/Note），
+以及从发送到解码完成的整个 transaction
+
+记录时只追加原始时间戳，开销预算为每个事务 10us 以内（串口上一个事务至少数毫秒），见 bench/bench_trace.py
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from fm22x.note import Note
+from fm22x.request import Command, Request
+from fm22x.response import Response
+
+_THREADS = {"host": 1, "device": 2, "link": 3, "transactions": 4}
+
+
+def _command_name(command: int) -> str:
+    try:
+        return Command(command).name
+    except ValueError:
+        return hex(command)
+
+
+class Tracer:
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.perf_counter,
+        max_events: int = 1_000_000,
+        pid: int | None = None,
+    ):
+        """
+
+        :param clock: 时钟（秒）
+        :param max_events: 最多保留的事件数，超出后丢弃最早的
+        :param pid: trace 中的进程号，默认当前进程
+        """
+        self.clock = clock
+        self.pid = os.getpid() if pid is None else pid
+        # 记录时只保存原始时间戳，名称在导出时生成以降低开销：
+        # ("encode", command, start, end)
+        # ("frame", 事件类型, 首字节, 末字节, 分帧完成, 解码开始, 解码结束, 发送开始, 发送结束, result)
+        # ("span", name, thread, start, end)
+        self.events: deque[tuple] = deque(maxlen=max_events)
+
+    def on_send(self, req: Request, start: float, end: float) -> None:
+        self.events.append(("encode", req.command, start, end))
+
+    def on_frame(
+        self,
+        event: Response | Note,
+        first_byte: float,
+        last_byte: float,
+        frame_done: float,
+        decode_start: float,
+        decode_end: float,
+        sent: tuple[float, float] | None = None,
+    ) -> None:
+        """
+        :param sent: 对应请求编码的开始和结束时间，来自 Connection.pending
+        """
+        result = event.result if isinstance(event, Response) else None
+        self.events.append(
+            (
+                "frame",
+                type(event),
+                first_byte,
+                last_byte,
+                frame_done,
+                decode_start,
+                decode_end,
+                *(sent or (None, None)),
+                result,
+            )
+        )
+
+    @contextmanager
+    def span(self, name: str, thread: str = "host") -> Iterator[None]:
+        """
+        标记自定义阶段，例如串口写入
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.events.append(("span", name, thread, start, self.clock()))
+
+    def chrome_trace(self) -> dict:
+        events: list[dict] = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": tid,
+                "args": {"name": thread},
+            }
+            for thread, tid in _THREADS.items()
+        ]
+        pid = self.pid
+
+        def add(name: str, thread: str, start: float, end: float, args=None) -> None:
+            ev = {
+                "name": name,
+                "ph": "X",
+                "pid": pid,
+                "tid": _THREADS[thread],
+                "ts": start * 1e6,
+                "dur": max(0.0, end - start) * 1e6,
+            }
+            if args:
+                ev["args"] = args
+            events.append(ev)
+
+        for record in self.events:
+            stage = record[0]
+            if stage == "encode":
+                _, command, start, end = record
+                add(f"encode {_command_name(command)}", "host", start, end)
+            elif stage == "span":
+                _, name, thread, start, end = record
+                add(name, thread, start, end)
+            else:
+                _, tp, first, last, done, ds, de, sent, sent_end, result = record
+                name = tp.__name__
+                add(f"receive {name}", "link", first, last)
+                add(f"frame {name}", "host", last, done)
+                add(f"decode {name}", "host", ds, de)
+                if sent is not None:
+                    add(f"device {name}", "device", sent_end, first)
+                    add(
+                        tp.mid.name,
+                        "transactions",
+                        sent,
+                        de,
+                        {"result": result.name},
+                    )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def clear(self) -> None:
+        self.events.clear()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import math
+import time
+from array import array
+from typing import Iterable, Iterator
+
+from fm22x.note import FACE_SIZE, FaceState, NidFaceState, Note, decode_face, face_state
+
+# 窗口中的列
+_T, _X, _Y, _W, _YAW, _PITCH, _ROLL = range(7)
+
+
+class FaceTracker:
+    """
+    基于 NidFaceState 的滑动窗口人脸跟踪，只在 FaceState 变化时产生引导事件。
+    不完整的 note 会被忽略，未知的状态码按 FaceState.UNKNOW_STATUS 处理
+    """
+
+    def __init__(self, window: int = 8):
+        """
+
+        :param window: 滑动窗口长度（帧）
+        """
+        if window < 2:
+            raise ValueError("Window too small")
+        self.window = window
+        self.state: FaceState | None = None
+        self._cols = [array("d", bytes(8 * window)) for _ in range(7)]
+        self._pos = 0  # 下一个写入位置
+        self._count = 0
+
+    def reset(self) -> None:
+        self.state = None
+        self._pos = 0
+        self._count = 0
+
+    def feed(self, note: Note, now: float | None = None) -> FaceState | None:
+        """
+        输入一个 note，FaceState 发生变化时返回新的状态，否则返回 None
+        :param note: Connection 产生的 note，非 NidFaceState 会被忽略
+        :param now: 时间戳（秒），默认 time.monotonic()
+        """
+        if not isinstance(note, NidFaceState) or len(note.data) < FACE_SIZE:
+            return None
+        code, left, top, right, bottom, yaw, pitch, roll = decode_face(note.data)
+        state = face_state(code)
+        if state == FaceState.NOFACE:
+            # _column 从 0 开始读未填满的窗口，两者要一起清零
+            self._pos = 0
+            self._count = 0
+        else:
+            pos = self._pos
+            cols = self._cols
+            cols[_T][pos] = time.monotonic() if now is None else now
+            cols[_X][pos] = (left + right) / 2
+            cols[_Y][pos] = (top + bottom) / 2
+            cols[_W][pos] = right - left
+            cols[_YAW][pos] = yaw
+            cols[_PITCH][pos] = pitch
+            cols[_ROLL][pos] = roll
+            self._pos = (pos + 1) % self.window
+            if self._count < self.window:
+                self._count += 1
+        if state != self.state:
+            self.state = state
+            return state
+        return None
+
+    def track(self, events: Iterable[Note]) -> Iterator[FaceState]:
+        """
+        过滤 Connection 的事件流，只产出变化后的 FaceState
+        """
+        for ev in events:
+            changed = self.feed(ev)
+            if changed is not None:
+                yield changed
+
+    def _column(self, col: int) -> array:
+        if self._count < self.window:
+            return self._cols[col][: self._count]
+        return self._cols[col]
+
+    def _mean(self, col: int) -> float:
+        if not self._count:
+            return math.nan
+        return math.fsum(self._column(col)) / self._count
+
+    @property
+    def position(self) -> tuple[float, float]:
+        """
+        平滑后的人脸中心坐标
+        """
+        return self._mean(_X), self._mean(_Y)
+
+    @property
+    def size(self) -> float:
+        """
+        平滑后的人脸宽度
+        """
+        return self._mean(_W)
+
+    @property
+    def pose(self) -> tuple[float, float, float]:
+        """
+        平滑后的 yaw, pitch, roll
+        """
+        return self._mean(_YAW), self._mean(_PITCH), self._mean(_ROLL)
+
+    @property
+    def velocity(self) -> tuple[float, float]:
+        """
+        人脸中心移动速度（像素/秒），对窗口做最小二乘拟合
+        """
+        if self._count < 2:
+            return 0.0, 0.0
+        t = self._column(_T)
+        tm = self._mean(_T)
+        dt = [v - tm for v in t]
+        var = math.fsum(d * d for d in dt)
+        if not var:
+            return 0.0, 0.0
+        xm, ym = self.position
+        vx = math.fsum(d * (v - xm) for d, v in zip(dt, self._column(_X))) / var
+        vy = math.fsum(d * (v - ym) for d, v in zip(dt, self._column(_Y))) / var
+        return vx, vy
+
+    @property
+    def stability(self) -> float:
+        """
+        稳定度 0-1，1 - 中心抖动标准差/人脸宽度
+        """
+        if self._count < 2:
+            return 0.0
+        xm, ym = self.position
+        jitter = math.sqrt(
+            (
+                math.fsum((v - xm) ** 2 for v in self._column(_X))
+                + math.fsum((v - ym) ** 2 for v in self._column(_Y))
+            )
+            / self._count
+        )
+        width = self.size
+        if width <= 0:
+            return 0.0
+        return max(0.0, 1.0 - jitter / width)
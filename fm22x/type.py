@@ -1,11 +1,27 @@
 # -*- coding: utf-8 -*-
-from typing import Protocol, Self
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Protocol, TypeVar
+
+if TYPE_CHECKING:
+    from fm22x.request import Request
+    from fm22x.response import Response
+
+_F = TypeVar("_F", bound="ProtocolFrame")
 
 
 class ProtocolFrame(Protocol):
     def encode(self) -> bytes: ...
 
     @classmethod
-    def decode(cls, raw: bytes) -> Self: ...
+    def decode(cls: type[_F], raw: bytes) -> _F: ...
 
     def validate(self) -> bool: ...
+
+
+class Transport(Protocol):
+    """
+    一问一答的设备通道，由使用者基于串口等实现
+    """
+
+    async def call(self, req: Request) -> Response: ...
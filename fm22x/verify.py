@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+连续识别：收到结果后立即重新下发 Verify，统计从检测到人脸到出结果的延迟
+"""
+from __future__ import annotations
+
+import time
+from enum import Enum, auto
+from typing import Callable
+
+from fm22x.metrics import LatencyHistogram
+from fm22x.note import FaceState, NidFaceState, NidReady, Note
+from fm22x.request import Request, Verify
+from fm22x.response import MidVerify, MsgResultCode, Response
+
+# 需要退避的结果，立刻重试只会继续失败
+BACKOFF_RESULTS = frozenset((MsgResultCode.FAILED4_CAMERA, MsgResultCode.MR_REJECTED))
+
+
+class LoopState(Enum):
+    idle = auto()
+    armed = auto()  # Verify 已下发，等待结果
+    backoff = auto()  # 等待 resume_at 后重新下发
+    powered_down = auto()  # pd_rightaway 解锁成功后模组断电，等待 NidReady
+    stopped = auto()
+
+
+class VerifyLoop:
+    """
+    sans-io 状态机：start()/feed()/poll() 返回需要发送的请求
+    """
+
+    def __init__(
+        self,
+        timeout: int = 5,
+        pd_rightaway: bool = False,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        margin: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+
+        :param timeout: 每次 Verify 的解锁超时时间（单位s）
+        :param pd_rightaway: 解锁成功后是否立刻断电，为 True 时等待 NidReady 再继续
+        :param backoff: 首次退避时间（秒），连续失败时翻倍
+        :param max_backoff: 最长退避时间（秒）
+        :param margin: 超过 timeout 多久仍没有结果时视为回复丢失并重新下发（秒）
+        :param clock: 时钟
+        """
+        self.timeout = timeout
+        self.pd_rightaway = pd_rightaway
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.margin = margin
+        self.clock = clock
+
+        self.state = LoopState.idle
+        self.resume_at: float | None = None
+        self.deadline: float | None = None  # armed 时等待结果的截止时间
+        self.lost = 0  # 超过 deadline 仍没有结果而重新下发的次数
+        self.latency = LatencyHistogram()  # 检测到人脸 -> 任意结果
+        self.unlock_latency = LatencyHistogram()  # 检测到人脸 -> 解锁成功
+        self.results: dict[MsgResultCode, int] = {}
+        self.last: MidVerify | None = None
+
+        self._failures = 0
+        self._face_at: float | None = None
+        self._request = Verify(pd_rightaway, timeout)
+
+    def _arm(self, now: float) -> list[Request]:
+        self.state = LoopState.armed
+        self.resume_at = None
+        self.deadline = now + self.timeout + self.margin
+        self._face_at = None
+        return [self._request]
+
+    def start(self, now: float | None = None) -> list[Request]:
+        return self._arm(self.clock() if now is None else now)
+
+    def stop(self) -> None:
+        """
+        不再重新下发，已下发的 Verify 的结果仍会统计
+        """
+        self.state = LoopState.stopped
+
+    def poll(self, now: float | None = None) -> list[Request]:
+        """
+        退避结束或等待结果超过 deadline 时重新下发，调用者应在 resume_at 或 deadline 之后调用
+        """
+        if self.state == LoopState.backoff:
+            now = self.clock() if now is None else now
+            if now >= self.resume_at:  # type: ignore
+                return self._arm(now)
+        elif self.state == LoopState.armed:
+            now = self.clock() if now is None else now
+            if now >= self.deadline:  # type: ignore
+                self.lost += 1
+                return self._arm(now)
+        return []
+
+    def feed(self, event: Response | Note, now: float | None = None) -> list[Request]:
+        """
+        输入 Connection 产生的事件
+        :return: 需要发送的请求
+        """
+        if isinstance(event, NidFaceState):
+            if (
+                self._face_at is None
+                and self.state in (LoopState.armed, LoopState.stopped)
+                and event.state != FaceState.NOFACE
+            ):
+                self._face_at = self.clock() if now is None else now
+            return []
+        if isinstance(event, MidVerify):
+            return self._on_result(event, self.clock() if now is None else now)
+        if isinstance(event, NidReady) and self.state == LoopState.powered_down:
+            return self._arm(self.clock() if now is None else now)
+        return []
+
+    def _on_result(self, resp: MidVerify, now: float) -> list[Request]:
+        result = resp.result
+        self.last = resp
+        self.results[result] = self.results.get(result, 0) + 1
+        if self._face_at is not None:
+            self.latency.record(now - self._face_at)
+            if result == MsgResultCode.SUCCESS:
+                self.unlock_latency.record(now - self._face_at)
+            self._face_at = None
+        self.deadline = None
+        if self.state == LoopState.stopped:
+            return []
+        if result in BACKOFF_RESULTS:
+            delay = min(self.max_backoff, self.backoff * 2**self._failures)
+            if delay < self.max_backoff:  # 到达上限后不再增长，避免 OverflowError
+                self._failures += 1
+            self.state = LoopState.backoff
+            self.resume_at = now + delay
+            return []
+        self._failures = 0
+        if result == MsgResultCode.SUCCESS and self.pd_rightaway:
+            self.state = LoopState.powered_down
+            return []
+        return self._arm(now)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+多个测试共用的事件构造
+"""
+import sys
+
+sys.path.append(".")
+from fm22x.note import FaceInfo, FaceState, NidFaceState, encode_face
+
+
+def face(
+    state: FaceState = FaceState.NORMAL,
+    left: int = 0,
+    top: int = 0,
+    size: int = 100,
+    yaw: int = 0,
+) -> NidFaceState:
+    info = FaceInfo(state, left, top, left + size, top + size, yaw, 0, 0)
+    return NidFaceState(1, encode_face(info))
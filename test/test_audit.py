@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.audit import NO_USER, AuditKind, AuditLog
+from fm22x.connection import Connection
+from fm22x.request import DeleteUser
+from fm22x.response import MidEnrollWithPhoto, MidVerify, MsgResultCode
+from fm22x.sim import encode_frame
+
+
+def verify(user_id: int | None) -> MidVerify:
+    if user_id is None:
+        return MidVerify(0x12, MsgResultCode.FAILED4_TIMEOUT, b"")
+    return MidVerify(0x12, 0, user_id.to_bytes(2, "big") + bytes(32) + b"\x00\x01")
+
+
+class TestAudit(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_query_across_segments(self):
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            for i in range(10):
+                log.feed(verify(i % 3 if i != 5 else None), ts=100.0 + i)
+            self.assertEqual(
+                [r.timestamp for r in log.query(user_id=1)], [101.0, 104.0, 107.0]
+            )
+            self.assertEqual(
+                [r.timestamp for r in log.query(user_id=0, start=102, end=109)],
+                [103.0, 106.0],
+            )
+            self.assertEqual(len(log.query(start=103.5, end=106)), 2)
+            (failed,) = log.query(user_id=NO_USER)
+            self.assertEqual(failed.result, MsgResultCode.FAILED4_TIMEOUT)
+        names = sorted(os.listdir(self.tmp.name))
+        self.assertIn("00000000.idx", names)
+        self.assertIn("00000001.idx", names)
+        self.assertNotIn("00000002.idx", names)
+
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            self.assertEqual(len(log.query(user_id=1)), 3)
+            log.feed(verify(1), ts=50.0)  # clock went backwards
+            self.assertEqual(log.query(user_id=1)[-1].timestamp, 50.0)
+            self.assertEqual(log.query(user_id=1)[-1].extra, 1)
+            self.assertEqual(len(log.query(start=100.0)), 10)
+
+    def test_delete_uses_request(self):
+        con = Connection()
+        con.send(DeleteUser(42))
+        (resp,) = con.receive(encode_frame(0x00, b"\x20\x00"))
+        with AuditLog(self.tmp.name) as log:
+            self.assertTrue(log.feed(resp, ts=1.0))
+            (rec,) = log.query(user_id=42)
+            self.assertEqual(rec.kind, AuditKind.DELETE)
+
+    def test_delete_many_in_flight(self):
+        con = Connection()
+        con.send_many([DeleteUser(1), DeleteUser(2), DeleteUser(3)])
+        reply = encode_frame(0x00, b"\x20\x00")
+        with AuditLog(self.tmp.name) as log:
+            for resp in con.receive(reply * 3):
+                self.assertTrue(log.feed(resp, ts=1.0))
+            for user_id in (1, 2, 3):
+                (rec,) = log.query(user_id=user_id)
+                self.assertEqual(rec.kind, AuditKind.DELETE)
+            self.assertEqual(log.query(user_id=NO_USER), [])
+
+    def test_enroll_with_photo(self):
+        with AuditLog(self.tmp.name) as log:
+            # 中间分包的回复只有包序号
+            chunk = MidEnrollWithPhoto(0xF7, 0, b"\x00\x00")
+            self.assertFalse(log.feed(chunk, ts=1.0))
+            last = MidEnrollWithPhoto(0xF7, 0, b"\x00\x01\x00\x09")
+            self.assertTrue(log.feed(last, ts=2.0))
+            failed = MidEnrollWithPhoto(0xF7, MsgResultCode.FAILED4_JPGPHOTO_LARGE, b"")
+            self.assertTrue(log.feed(failed, ts=3.0))
+            (rec,) = log.query(user_id=9)
+            self.assertEqual((rec.kind, rec.mid), (AuditKind.ENROLL, 0xF7))
+            (rec,) = log.query(user_id=NO_USER)
+            self.assertEqual(rec.result, MsgResultCode.FAILED4_JPGPHOTO_LARGE)
+
+    def test_out_of_order(self):
+        stamps = [10.0, 11.0, 5.0, 12.0, 20.0, 21.0]
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            for i, ts in enumerate(stamps):
+                log.feed(verify(i % 2), ts=ts)
+            stored = [r.timestamp for r in log.query(end=11.5)]
+            self.assertEqual(stored, [10.0, 11.0, 5.0])
+            (rec,) = log.query(user_id=0, start=4, end=6)
+            self.assertEqual(rec.timestamp, 5.0)
+        self.assertIn("00000000.rng", os.listdir(self.tmp.name))
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            log.feed(verify(1), ts=1.0)  # 未封存的分段也乱序
+            self.assertEqual([r.timestamp for r in log.query(end=6)], [5.0, 1.0])
+            self.assertEqual(len(log.query(user_id=1, start=12)), 2)
+
+    def test_reopen_after_crash(self):
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            for i in range(6):
+                log.feed(verify(i), ts=float(i))
+        # 最后一次写入只写了一半
+        with open(os.path.join(self.tmp.name, "00000001.seg"), "ab") as f:
+            f.write(b"\x01\x02\x03")
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            log.feed(verify(7), ts=7.0)
+            self.assertEqual([r.user_id for r in log.query(start=4.0)], [4, 5, 7])
+            self.assertEqual(len(log.query(user_id=7)), 1)
+
+    def test_seal_full_segment_on_reopen(self):
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            for i in range(4):
+                log.feed(verify(i), ts=float(i))
+        # 写满后未来得及封存
+        os.remove(os.path.join(self.tmp.name, "00000000.idx"))
+        os.remove(os.path.join(self.tmp.name, "00000001.seg"))
+        with AuditLog(self.tmp.name, segment_records=4) as log:
+            log.feed(verify(4), ts=4.0)
+            self.assertEqual(len(log.query(user_id=1)), 1)
+            self.assertEqual(len(log.query()), 5)
+        names = sorted(os.listdir(self.tmp.name))
+        self.assertEqual(names, ["00000000.idx", "00000000.seg", "00000001.seg"])
+        self.assertEqual(os.path.getsize(os.path.join(self.tmp.name, "00000000.seg")), 64)
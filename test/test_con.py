@@ -5,7 +5,10 @@ sys.path.append(".")
 from unittest import TestCase
 
 from fm22x.connection import Connection
+from fm22x.crypto import XorCipher
+from fm22x.request import DeleteUser, GetStatus, InitEncryption
 from fm22x.response import MidEnroll, MidReset
+from fm22x.sim import encode_frame
 
 
 class TestCon(TestCase):
@@ -111,6 +114,135 @@ class TestCon(TestCase):
             if isinstance(ev, MidEnroll):
                 pass
 
+    def test_send_many(self):
+        reqs = [DeleteUser(i) for i in range(1, 100)] + [GetStatus()]
+        expected = b"".join(req.encode() for req in reqs)
+        self.assertEqual(self.con.send_many(reqs), expected)
+        views = self.con.send_many(reqs, vectored=True)
+        self.assertEqual(len(views), len(reqs))
+        self.assertEqual([bytes(v) for v in views], [req.encode() for req in reqs])
+        self.assertEqual(self.con.send_many([]), b"")
+
+    def test_snapshot(self):
+        self.con.send(DeleteUser(42))
+        data = bytes.fromhex("EF AA 00 00 02 20 00 22")
+        list(self.con.receive(data[:6]))
+        con = Connection.restore(self.con.snapshot())
+        self.assertEqual(con.snapshot(), self.con.snapshot())
+        (ev,) = con.receive(data[6:])
+        self.assertEqual(ev.request.encode(), DeleteUser(42).encode())
+        self.assertEqual(con.pending, {})
+
+    def test_pending_fifo(self):
+        self.con.send_many([DeleteUser(1), DeleteUser(2), DeleteUser(3)])
+        self.assertEqual(len(self.con.pending[DeleteUser.command]), 3)
+        reply = bytes.fromhex("EF AA 00 00 02 20 00 22")
+        (ev,) = self.con.receive(reply)
+        self.assertEqual(ev.request.user_id, 1)
+        con = Connection.restore(self.con.snapshot())
+        events = list(con.receive(reply * 2))
+        self.assertEqual(
+            [ev.request.encode() for ev in events],
+            [DeleteUser(2).encode(), DeleteUser(3).encode()],
+        )
+        self.assertEqual(con.pending, {})
+        (ev,) = con.receive(reply)
+        self.assertIsNone(ev.request)
+
+    def test_consumer_exits_early(self):
+        self.con.send_many([DeleteUser(1), DeleteUser(2)])
+        reply = bytes.fromhex("EF AA 00 00 02 20 00 22")
+        for ev in self.con.receive(reply * 2):
+            break
+        self.assertEqual(ev.request.user_id, 1)
+        # 已经产出的帧不会再解析一次
+        (ev,) = self.con.receive(b"")
+        self.assertEqual(ev.request.user_id, 2)
+        self.assertEqual(self.con.pending, {})
+
+    def test_cancel_expire(self):
+        first, second, third = DeleteUser(1), DeleteUser(2), GetStatus()
+        self.con.send_many([first, second])
+        self.assertTrue(self.con.cancel(first))
+        self.assertFalse(self.con.cancel(first))
+        reply = bytes.fromhex("EF AA 00 00 02 20 00 22")
+        (ev,) = self.con.receive(reply)
+        self.assertIs(ev.request, second)
+        self.con.send(third)
+        sent = self.con.pending[GetStatus.command][0].sent
+        self.assertEqual(self.con.expire(1.0, now=sent + 0.5), [])
+        self.assertEqual(self.con.expire(1.0, now=sent + 2.0), [third])
+        self.assertEqual(self.con.pending, {})
+
+    def test_resync_clears_pending(self):
+        self.con.send_many([DeleteUser(1), DeleteUser(2)])
+        reply = bytes.fromhex("EF AA 00 00 02 20 00 22")
+        bad = bytearray(reply)
+        bad[-1] ^= 0xFF
+        with self.assertRaises(ValueError):
+            list(self.con.receive(bytes(bad) + reply))
+        self.con.resync()
+        # 不知道丢的是哪个回复，宁可不关联也不能关联错
+        (ev,) = self.con.receive(b"")
+        self.assertIsNone(ev.request)
+        self.assertEqual(self.con.pending, {})
+
+    def test_snapshot_cipher(self):
+        self.con.cipher = XorCipher(b"0123456789abcdef")
+        self.con.send(DeleteUser(1))
+        list(self.con.receive(b"\xef"))
+        data = self.con.snapshot()
+        self.assertNotIn(b"0123456789abcdef", data)
+        # 不会悄悄换成明文或别的密钥
+        with self.assertRaises(ValueError):
+            Connection.restore(data)
+        con = Connection.restore(data, cipher=XorCipher(b"0123456789abcdef"))
+        self.assertEqual((con.cipher.tx, con.cipher.rx), (1, 0))
+        self.assertEqual(con.buffer, b"\xef")
+        with self.assertRaises(ValueError):
+            Connection.restore(data + b"\x00")
+
+    def test_snapshot_cipher_factory(self):
+        class Plain:
+            # 只实现 Cipher 协议，没有 key 属性
+            tx = rx = 0
+
+            def encrypt_into(self, buf):
+                self.tx += 1
+
+            def decrypt_into(self, buf):
+                self.rx += 1
+
+        calls = []
+
+        def factory(seed, device_id, enc_key_number):
+            calls.append((seed, device_id, enc_key_number))
+            return Plain()
+
+        self.con.cipher_factory = factory
+        self.con.send(InitEncryption(1234))
+        list(self.con.receive(encode_frame(0x00, b"\x50\x00\x01\x02")))
+        self.con.send(DeleteUser(1))
+        con = Connection.restore(self.con.snapshot(), cipher_factory=factory)
+        self.assertEqual(calls, [(1234, b"\x01\x02", b"")] * 2)
+        self.assertEqual((con.cipher.tx, con.cipher.rx), (1, 0))
+        self.assertEqual(con.snapshot(), self.con.snapshot())
+
+    def test_resync(self):
+        good = bytes.fromhex("EF AA 00 00 02 10 00 12")
+        bad = bytearray(good)
+        bad[-1] ^= 0xFF
+        with self.assertRaises(ValueError):
+            list(self.con.receive(b"\x01\x02" + good))
+        self.assertEqual(self.con.resync(), 2)
+        self.assertEqual(len(list(self.con.receive(b""))), 1)
+        with self.assertRaises(ValueError):
+            list(self.con.receive(bytes(bad) + good[:3]))
+        self.assertEqual(self.con.resync(), len(good))
+        (ev,) = self.con.receive(good[3:])
+        self.assertIsInstance(ev, MidReset)
+        self.assertEqual(self.con.buffer, b"")
+
 
 if __name__ == "__main__":
     from unittest import main
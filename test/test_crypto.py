@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.connection import Connection
+from fm22x.crypto import XorCipher, derive_session_key, xor_session_cipher
+from fm22x.request import (
+    GetUserInfo,
+    InitEncryption,
+    MidSetReleaseEncKey,
+    calculate_checksum,
+)
+from fm22x.response import MidGetUserInfo
+from fm22x.sim import encode_frame
+
+
+def sealed(payload: bytes, cipher: XorCipher) -> bytes:
+    buf = bytearray(payload)
+    cipher.encrypt_into(memoryview(buf))
+    return bytes(buf)
+
+
+class TestCrypto(TestCase):
+    def setUp(self):
+        self.con = Connection()
+
+    def test_roundtrip(self):
+        host = XorCipher(b"0123456789abcdef")
+        device = XorCipher(b"0123456789abcdef", host=False)
+        sealed = []
+        for _ in range(2):
+            buf = bytearray(b"hello fm22x")
+            host.encrypt_into(memoryview(buf))
+            sealed.append(bytes(buf))
+            device.decrypt_into(memoryview(buf))
+            self.assertEqual(buf, b"hello fm22x")
+        # 每帧的密钥流不同
+        self.assertNotEqual(sealed[0], sealed[1])
+        self.assertNotEqual(sealed[0], b"hello fm22x")
+        buf = bytearray(b"hello fm22x")
+        device.encrypt_into(memoryview(buf))
+        self.assertNotEqual(bytes(buf), sealed[0])  # 两个方向的密钥流不同
+        self.assertEqual((host.tx, host.rx, device.tx, device.rx), (2, 0, 1, 2))
+
+    def test_key_cached(self):
+        k1 = derive_session_key(1234, b"\x01\x02", b"k" * 16)
+        k2 = derive_session_key(1234, b"\x01\x02", b"k" * 16)
+        self.assertIs(k1, k2)
+        self.assertEqual(len(k1), 16)
+        self.assertNotEqual(k1, derive_session_key(1235, b"\x01\x02", b"k" * 16))
+
+    def test_send_encrypted(self):
+        cipher = XorCipher(b"0123456789abcdef")
+        self.con.cipher = cipher
+        req = GetUserInfo(7)
+        raw = bytearray(self.con.send(req))
+        self.assertEqual(len(raw), len(req.encode()))
+        self.assertEqual(raw[-1], calculate_checksum(raw[:-1]))
+        XorCipher(cipher.key, host=False).decrypt_into(memoryview(raw)[5:-1])
+        self.assertEqual(raw[5:-1], req.data)
+
+    def test_send_buffer_reused(self):
+        self.con.cipher = XorCipher(b"0123456789abcdef")
+        device = XorCipher(b"0123456789abcdef", host=False)
+        reqs = [GetUserInfo(7), MidSetReleaseEncKey(b"k" * 16), GetUserInfo(8)]
+        for req in reqs:
+            raw = bytearray(self.con.send(req))
+            self.assertEqual(raw[-1], calculate_checksum(raw[:-1]))
+            device.decrypt_into(memoryview(raw)[5:-1])
+            self.assertEqual(raw[:-1], req.encode()[:-1])
+
+    def test_init_encryption(self):
+        self.con.cipher_factory = xor_session_cipher
+        self.con.send(MidSetReleaseEncKey(b"k" * 16))
+        self.con.send(InitEncryption(1234))
+        device_id = b"\x00\x11\x22\x33"
+        events = list(self.con.receive(encode_frame(0x00, b"\x50\x00" + device_id)))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(
+            self.con.cipher.key, derive_session_key(1234, device_id, b"k" * 16)
+        )
+        device = XorCipher(derive_session_key(1234, device_id, b"k" * 16), host=False)
+        payload = b"\x22\x00\x00\x07alice\x01"
+        events = list(self.con.receive(encode_frame(0x00, sealed(payload, device))))
+        self.assertIsInstance(events[0], MidGetUserInfo)
+        self.assertEqual(events[0].user_id, 7)
+        self.assertEqual(events[0].user_name, "alice")
+
+    def test_init_encryption_frames(self):
+        # export/shm 等只用 receive_frames 的消费者也要切换密钥
+        self.con.cipher_factory = xor_session_cipher
+        self.con.send(MidSetReleaseEncKey(b"k" * 16))
+        self.con.send(InitEncryption(1234))
+        device_id = b"\x00\x11\x22\x33"
+        device = XorCipher(derive_session_key(1234, device_id, b"k" * 16), host=False)
+        payload = b"\x22\x00\x00\x07alice\x01"
+        stream = encode_frame(0x00, b"\x50\x00" + device_id)
+        stream += encode_frame(0x00, sealed(payload, device))
+        frames = list(self.con.receive_frames(stream))
+        self.assertEqual([bytes(p) for _, p in frames][1], payload)
+        self.assertEqual(list(self.con.pending), [MidSetReleaseEncKey.command])
+
+    def test_no_factory(self):
+        # 没有 cipher_factory 时不会自动切换到加密模式
+        self.con.send(InitEncryption(1234))
+        (ev,) = self.con.receive(encode_frame(0x00, b"\x50\x00\x00\x11\x22\x33"))
+        self.assertIsNone(self.con.cipher)
+        self.assertEqual(ev.request.seed, 1234)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.connection import Connection
+from fm22x.crypto import xor_session_cipher
+from fm22x.dispatch import Dispatcher
+from fm22x.note import NID, NidFaceState, NidReady
+from fm22x.request import GetStatus, InitEncryption, Verify
+from fm22x.response import MID, MidGetStatus, MidVerify, MsgResultCode, Response
+from fm22x.sim import VirtualDevice, encode_frame
+
+
+class TestDispatcher(TestCase):
+    def setUp(self):
+        self.con = Connection()
+        self.dispatcher = Dispatcher()
+        self.got = []
+
+    def test_subscribe(self):
+        d = self.dispatcher
+        d.subscribe(MidVerify, self.got.append)
+        d.subscribe(NID.FACE_STATE, self.got.append)
+        unlocked = []
+        d.on(MID.MID_VERIFY, MsgResultCode.SUCCESS)(unlocked.append)
+        dev = VirtualDevice(users={3: "c"}, face_notes=2)
+        n = d.feed(self.con, dev.feed(self.con.send(Verify(False, 5))))
+        self.assertEqual(n, 3)
+        self.assertEqual(
+            [type(ev) for ev in self.got], [NidFaceState] * 2 + [MidVerify]
+        )
+        (resp,) = unlocked
+        self.assertIs(resp, self.got[-1])
+        self.assertEqual(resp.user_id, 3)
+        self.assertEqual(resp.request.command, Verify.command)
+        self.assertEqual(self.con.pending, {})
+
+        dev.users.clear()
+        d.feed(self.con, dev.feed(self.con.send(Verify(False, 5))))
+        self.assertEqual(self.got[-1].result, MsgResultCode.FAILED4_UNKNOWNUSER)
+        self.assertEqual(len(unlocked), 1)
+
+    def test_skip_unsubscribed(self):
+        d = self.dispatcher
+        d.subscribe(MidGetStatus, self.got.append)
+        dev = VirtualDevice(users={3: "c"}, face_notes=5)
+        data = dev.feed(self.con.send(Verify(False, 5)))
+        data += dev.feed(self.con.send(GetStatus()))
+        self.assertEqual(d.feed(self.con, data), 1)
+        self.assertEqual(d.skipped, 6)
+        self.assertEqual(self.con.pending, {})
+        self.assertIsInstance(self.got[0], MidGetStatus)
+
+    def test_dispatch(self):
+        d = self.dispatcher
+        d.subscribe(NidReady, self.got.append)
+        d.subscribe(MidVerify, self.got.append, MsgResultCode.FAILED4_TIMEOUT)
+        ready = NidReady(0, b"")
+        self.assertTrue(d.dispatch(ready))
+        self.assertFalse(d.dispatch(MidVerify(0x12, 0, b"")))
+        self.assertTrue(d.dispatch_frame(0x00, bytes((0x12, 13))))
+        self.assertFalse(d.dispatch_frame(0x01, bytes((NID.FACE_STATE,)) + bytes(16)))
+        self.assertIs(self.got[0], ready)
+        self.assertEqual(self.got[1].result, MsgResultCode.FAILED4_TIMEOUT)
+
+    def test_unsubscribe(self):
+        d = self.dispatcher
+        d.subscribe(MidGetStatus, self.got.append)
+        d.subscribe(MidGetStatus, self.got.append, MsgResultCode.SUCCESS)
+        payload = bytes((0x11, 0, 0))
+        d.dispatch_frame(0x00, payload)
+        self.assertEqual(len(self.got), 2)
+        d.unsubscribe(MidGetStatus, self.got.append)
+        d.dispatch_frame(0x00, payload)
+        self.assertEqual(len(self.got), 3)
+        d.unsubscribe(MidGetStatus, self.got.append, MsgResultCode.SUCCESS)
+        self.assertFalse(d.dispatch_frame(0x00, payload))
+        with self.assertRaises(ValueError):
+            d.unsubscribe(MidGetStatus, self.got.append)
+
+    def test_invalid(self):
+        d = self.dispatcher
+        for kind in (Response, int, 0x12, "MidVerify"):
+            with self.assertRaises(ValueError):
+                d.subscribe(kind, self.got.append)
+        with self.assertRaises(ValueError):
+            d.subscribe(NidReady, self.got.append, MsgResultCode.SUCCESS)
+        with self.assertRaises(ValueError):
+            d.subscribe(MidVerify, self.got.append, 99)
+
+    def test_short_frames(self):
+        d = self.dispatcher
+        d.subscribe(MidGetStatus, self.got.append)
+        d.subscribe(NidReady, self.got.append)
+        self.assertFalse(d.dispatch_frame(0x00, b"\x11"))
+        self.assertFalse(d.dispatch_frame(0x01, b""))
+        data = encode_frame(0x00, b"\x11") + encode_frame(0x01, b"")
+        data += encode_frame(0x01, b"\x00")
+        self.assertEqual(d.feed(self.con, data), 1)
+        self.assertEqual(d.skipped, 4)
+        self.assertEqual([type(ev) for ev in self.got], [NidReady])
+
+    def test_handler_error(self):
+        def handler(event):
+            self.got.append(event)
+            if len(self.got) == 1:
+                raise RuntimeError("handler failed")
+
+        self.dispatcher.subscribe(NidReady, handler)
+        ready = encode_frame(0x01, b"\x00")
+        with self.assertRaises(RuntimeError):
+            self.dispatcher.feed(self.con, ready * 2)
+        # 出错的帧已经消费，不会再分发一次
+        self.assertEqual(self.dispatcher.feed(self.con, b""), 1)
+        self.assertEqual(len(self.got), 2)
+        self.assertEqual(self.con.buffer, b"")
+
+    def test_init_encryption(self):
+        self.con.cipher_factory = xor_session_cipher
+        self.con.send(InitEncryption(0x12345678))
+        reply = encode_frame(0x00, bytes((0x50, 0)) + b"device0001")
+        self.assertEqual(self.dispatcher.feed(self.con, reply), 0)
+        self.assertIsNotNone(self.con.cipher)
+        self.assertEqual(self.con.pending, {})
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.enroll import EnrollWorkflow
+from fm22x.note import FaceState
+from fm22x.request import Enroll, FaceDir, FaceReset
+from fm22x.response import MidEnroll, MidFaceReset, MsgResultCode
+from helpers import face
+
+
+def enrolled(
+    req: Enroll, mask: int, result: MsgResultCode = MsgResultCode.SUCCESS
+) -> MidEnroll:
+    resp = MidEnroll(0x13, result, b"\x00\x05" + bytes([mask]))
+    resp.request = req  # 由 Connection 关联
+    return resp
+
+
+class TestEnroll(TestCase):
+    def test_full_sequence(self):
+        flow = EnrollWorkflow("alice", directions=(FaceDir.MIDDLE, FaceDir.UP))
+        (req,) = flow.start()
+        self.assertIsInstance(req, Enroll)
+        self.assertEqual(req.face_dir, FaceDir.MIDDLE)
+        (req,) = flow.feed(enrolled(req, FaceDir.MIDDLE))
+        self.assertEqual(req.face_dir, FaceDir.UP)
+        self.assertEqual(flow.feed(enrolled(req, FaceDir.MIDDLE | FaceDir.UP)), [])
+        self.assertTrue(flow.finished)
+        self.assertFalse(flow.failed)
+        self.assertEqual(flow.user_id, 5)
+
+    def test_abort_on_noface(self):
+        flow = EnrollWorkflow("alice", directions=(FaceDir.MIDDLE,), noface_limit=3)
+        (aborted,) = flow.start()
+        self.assertEqual(flow.feed(face(FaceState.NOFACE)), [])
+        self.assertEqual(flow.feed(face(FaceState.NORMAL)), [])
+        flow.feed(face(FaceState.NOFACE))
+        flow.feed(face(FaceState.NOFACE))
+        (req,) = flow.feed(face(FaceState.NOFACE))
+        self.assertIsInstance(req, FaceReset)
+        self.assertEqual(flow.aborts, 1)
+        # the aborted enroll reply is ignored
+        self.assertEqual(flow.feed(enrolled(aborted, 0, MsgResultCode.ABORTED)), [])
+        (req,) = flow.feed(MidFaceReset(0x23, 0, b""))
+        self.assertEqual(req.face_dir, FaceDir.MIDDLE)
+        self.assertEqual(flow.attempts[FaceDir.MIDDLE], 2)
+
+    def test_give_up(self):
+        flow = EnrollWorkflow("alice", directions=(FaceDir.LEFT,), max_attempts=2)
+        (req,) = flow.start()
+        (req,) = flow.feed(enrolled(req, 0, MsgResultCode.FAILED4_TIMEOUT))
+        self.assertEqual(flow.feed(enrolled(req, 0, MsgResultCode.FAILED4_TIMEOUT)), [])
+        self.assertTrue(flow.failed)
+
+    def test_fatal(self):
+        flow = EnrollWorkflow("alice")
+        (req,) = flow.start()
+        self.assertEqual(flow.feed(enrolled(req, 0, MsgResultCode.FAILED4_MAXUSER)), [])
+        self.assertTrue(flow.failed)
+        self.assertEqual(flow.error, MsgResultCode.FAILED4_MAXUSER)
+
+    def test_reset_before_aborted_reply(self):
+        flow = EnrollWorkflow("alice", directions=(FaceDir.MIDDLE,), noface_limit=1)
+        (aborted,) = flow.start()
+        (req,) = flow.feed(face(FaceState.NOFACE))
+        self.assertIsInstance(req, FaceReset)
+        (req,) = flow.feed(MidFaceReset(0x23, 0, b""))
+        self.assertIsInstance(req, Enroll)
+        self.assertEqual(flow.attempts[FaceDir.MIDDLE], 2)
+        # the aborted enroll reply arrives after the reset and is not counted
+        self.assertEqual(flow.feed(enrolled(aborted, 0, MsgResultCode.ABORTED)), [])
+        self.assertEqual(flow.attempts[FaceDir.MIDDLE], 2)
+        self.assertEqual(flow.feed(enrolled(req, FaceDir.MIDDLE)), [])
+        self.assertTrue(flow.finished)
+
+    def test_aborted_enroll_never_replies(self):
+        flow = EnrollWorkflow("alice", directions=(FaceDir.MIDDLE,), noface_limit=1)
+        flow.start()
+        flow.feed(face(FaceState.NOFACE))
+        (req,) = flow.feed(MidFaceReset(0x23, 0, b""))
+        # 模组没有回复被中止的录入，新的录入的回复照常处理
+        self.assertEqual(flow.feed(enrolled(req, FaceDir.MIDDLE)), [])
+        self.assertTrue(flow.finished)
+
+    def test_enroll_finished_before_reset(self):
+        flow = EnrollWorkflow("alice", directions=(FaceDir.MIDDLE,), noface_limit=1)
+        (req,) = flow.start()
+        flow.feed(face(FaceState.NOFACE))
+        self.assertEqual(flow.feed(enrolled(req, FaceDir.MIDDLE)), [])
+        # 录入已经结束，FaceReset 失败也不再等待
+        failed = MidFaceReset(0x23, MsgResultCode.FAILED4_UNKNOWNREASON, b"")
+        self.assertEqual(flow.feed(failed), [])
+        self.assertTrue(flow.finished)
+
+    def test_reset_failed(self):
+        flow = EnrollWorkflow("alice", directions=(FaceDir.MIDDLE,), noface_limit=1)
+        (req,) = flow.start()
+        flow.feed(face(FaceState.NOFACE))
+        failed = MidFaceReset(0x23, MsgResultCode.FAILED4_UNKNOWNREASON, b"")
+        self.assertEqual(flow.feed(failed), [])
+        self.assertEqual(flow.attempts[FaceDir.MIDDLE], 1)
+        # the enroll was not cancelled, its reply counts
+        self.assertEqual(flow.feed(enrolled(req, FaceDir.MIDDLE)), [])
+        self.assertTrue(flow.finished)
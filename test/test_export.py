@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.connection import Connection
+from fm22x.export import ColumnarExporter, open_npy, open_npz
+from fm22x.note import FaceInfo, encode_face
+from fm22x.sim import encode_frame
+
+VERIFY_OK = encode_frame(
+    0x00, b"\x12\x00\x00\x2a" + b"bob".ljust(32, b"\x00") + b"\x01\x02"
+)
+VERIFY_FAIL = encode_frame(0x00, b"\x12\x0c")
+FACE = encode_frame(0x01, b"\x01" + encode_face(FaceInfo(4, 10, 20, 110, 120, -3, 2, 1)))
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.con = Connection()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunks(self):
+        with ColumnarExporter(self.tmp.name, chunk_rows=2) as exp:
+            exp.consume_capture(
+                self.con, [(1.0, VERIFY_OK), (2.0, FACE + VERIFY_FAIL), (3.0, VERIFY_OK)]
+            )
+        verify = os.path.join(self.tmp.name, "verify")
+        self.assertEqual(sorted(os.listdir(verify)), ["000000", "000001"])
+        self.assertEqual(
+            open_npy(os.path.join(verify, "000000", "user_id.npy")).tolist(), [42, 0]
+        )
+        self.assertEqual(
+            open_npy(os.path.join(verify, "000000", "result.npy")).tolist(), [0, 12]
+        )
+        self.assertEqual(
+            open_npy(os.path.join(verify, "000001", "timestamp.npy")).tolist(), [3.0]
+        )
+        self.assertEqual(
+            open_npy(os.path.join(verify, "000000", "unlock_status.npy")).tolist(),
+            [2, 0],
+        )
+        face = os.path.join(self.tmp.name, "face_state", "000000")
+        self.assertEqual(open_npy(os.path.join(face, "yaw.npy")).tolist(), [-3])
+        responses = os.path.join(self.tmp.name, "response")
+        self.assertEqual(len(os.listdir(responses)), 2)
+
+    def test_npz(self):
+        with ColumnarExporter(self.tmp.name, npz=True) as exp:
+            exp.consume(self.con, VERIFY_OK + FACE, ts=5.0)
+        face = open_npz(os.path.join(self.tmp.name, "face_state", "000000.npz"))
+        self.assertEqual(face["timestamp"].tolist(), [5.0])
+        self.assertEqual(face["state"].tolist(), [4])
+        self.assertEqual(face["yaw"].tolist(), [-3])
+        verify = open_npz(os.path.join(self.tmp.name, "verify", "000000.npz"))
+        self.assertEqual(verify["user_id"].tolist(), [42])
+        self.assertEqual(verify["unlock_status"].tolist(), [2])
+
+    def test_short_frames(self):
+        with ColumnarExporter(self.tmp.name) as exp:
+            exp.feed_frame(0x00, bytearray(), 1.0)
+            exp.feed_frame(0x00, bytearray(b"\x12"), 1.0)
+            exp.feed_frame(0x01, bytearray(), 1.0)
+            exp.consume(self.con, VERIFY_FAIL, ts=2.0)
+        verify = os.path.join(self.tmp.name, "verify", "000000")
+        self.assertEqual(open_npy(os.path.join(verify, "timestamp.npy")).tolist(), [2.0])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "face_state")))
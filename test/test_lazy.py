@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+import fm22x
+
+
+class TestLazy(TestCase):
+    def test_import_is_lazy(self):
+        out = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, fm22x; print(sorted(m for m in sys.modules if m.startswith('fm22x')))",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(out.strip(), "['fm22x']")
+
+    def test_getattr(self):
+        from fm22x.connection import Connection
+
+        self.assertIs(fm22x.Connection, Connection)
+        self.assertIs(fm22x.response, sys.modules["fm22x.response"])
+        with self.assertRaises(AttributeError):
+            fm22x.missing
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.photo import (
+    PhotoLimits,
+    Preflight,
+    check_photo,
+    inspect_jpeg,
+    strip_metadata,
+)
+from fm22x.response import MsgResultCode
+
+
+def segment(marker: int, body: bytes) -> bytes:
+    return bytes((0xFF, marker)) + (len(body) + 2).to_bytes(2, "big") + body
+
+
+def jpeg(width: int, height: int, progressive: bool = False, exif: int = 0) -> bytes:
+    sof = bytes((8,)) + height.to_bytes(2, "big") + width.to_bytes(2, "big") + b"\x03"
+    sof += b"\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    parts = [
+        b"\xff\xd8",
+        segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"),
+    ]
+    if exif:
+        parts.append(segment(0xE1, b"Exif\x00\x00" + bytes(exif)))
+        parts.append(segment(0xFE, b"comment"))
+    parts += [
+        segment(0xDB, bytes(65)),
+        segment(0xC2 if progressive else 0xC0, sof),
+        segment(0xDA, b"\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00"),
+        b"\x12\x34\xff\x00\x56",  # 熵编码数据
+        b"\xff\xd9",
+    ]
+    return b"".join(parts)
+
+
+class TestPhoto(TestCase):
+    def test_inspect(self):
+        info = inspect_jpeg(jpeg(640, 480))
+        self.assertEqual((info.width, info.height, info.components), (640, 480, 3))
+        self.assertFalse(info.progressive)
+        self.assertEqual(info.metadata, 0)
+        self.assertTrue(inspect_jpeg(jpeg(640, 480, progressive=True)).progressive)
+        # 标记前的填充字节
+        data = jpeg(640, 480)
+        self.assertEqual(inspect_jpeg(data[:2] + b"\xff" + data[2:]).width, 640)
+
+    def test_invalid(self):
+        data = jpeg(640, 480)
+        for bad in (b"", b"\x89PNG\r\n", data[:30], b"\xff\xd8\xff\xd9"):
+            with self.assertRaises(ValueError):
+                inspect_jpeg(bad)
+
+    def test_strip(self):
+        data = jpeg(640, 480, exif=1000)
+        info = inspect_jpeg(data)
+        stripped = strip_metadata(data)
+        self.assertEqual(len(data) - len(stripped), info.metadata)
+        self.assertEqual(stripped, jpeg(640, 480))
+        self.assertEqual(strip_metadata(stripped), stripped)
+
+    def test_check(self):
+        limits = PhotoLimits(max_size=4096)
+        cases = {
+            (640, 480, False, 0): MsgResultCode.SUCCESS,
+            (4000, 3000, False, 0): MsgResultCode.FAILED4_JPGPHOTO_LARGE,
+            (100, 100, False, 0): MsgResultCode.FAILED4_JPGPHOTO_SMALL,
+            (640, 480, True, 0): MsgResultCode.FAILED4_INVALIDPARAM,
+            (640, 480, False, 8000): MsgResultCode.FAILED4_JPGPHOTO_LARGE,
+        }
+        for (w, h, progressive, exif), result in cases.items():
+            info = inspect_jpeg(jpeg(w, h, progressive, exif))
+            self.assertEqual(check_photo(info, limits), result)
+
+    def test_preflight(self):
+        pre = Preflight(PhotoLimits(max_size=4096))
+        # 去掉元数据后不超过 max_size
+        ok = pre.check(jpeg(640, 480, exif=8000))
+        self.assertEqual(ok.result, MsgResultCode.SUCCESS)
+        self.assertEqual(ok.photo, jpeg(640, 480))
+        self.assertEqual(ok.info.size, len(ok.photo))
+        self.assertEqual(pre.check(jpeg(640, 480, exif=8000)), ok)
+        self.assertEqual((pre.hits, pre.misses), (1, 1))
+        self.assertEqual(ok.digest, hashlib.sha256(jpeg(640, 480, exif=8000)).digest())
+        bad = pre.check(b"not a jpeg")
+        self.assertEqual(bad.result, MsgResultCode.FAILED4_INVALIDPARAM)
+        self.assertIsNone(bad.info)
+        raw = Preflight(PhotoLimits(max_size=4096), normalize=False)
+        self.assertEqual(
+            raw.check(jpeg(640, 480, exif=8000)).result,
+            MsgResultCode.FAILED4_JPGPHOTO_LARGE,
+        )
+
+    def test_cache_size(self):
+        pre = Preflight(cache_size=2)
+        for w in (200, 300, 400, 200):
+            pre.check(jpeg(w, 200))
+        self.assertEqual((pre.hits, pre.misses), (0, 4))
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import sys
+import threading
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.connection import Connection
+from fm22x.note import NidFaceState
+from fm22x.request import DeleteUser, GetStatus
+from fm22x.response import MidGetStatus, MidReset
+from fm22x.shm import EventBus, EventBusReader
+
+RESET = bytes.fromhex("EF AA 00 00 02 10 00 12")
+STATUS = bytes.fromhex("EF AA 00 00 03 11 00 00 12")
+
+
+def _child(name: str, queue) -> None:
+    with EventBusReader(name, slot=1, from_start=True) as reader:
+        queue.put([type(ev).__name__ for _, ev in reader.poll()])
+        reader.send(DeleteUser(3))
+
+
+class TestShm(TestCase):
+    def setUp(self):
+        self.bus = EventBus(capacity=4, record_size=48)
+        self.con = Connection()
+
+    def tearDown(self):
+        self.bus.close()
+
+    def test_publish_poll(self):
+        with EventBusReader(self.bus.name) as reader:
+            self.assertEqual(self.bus.pump(self.con, RESET + STATUS, ts=1.0), 2)
+            events = reader.poll()
+            self.assertEqual([ts for ts, _ in events], [1.0, 1.0])
+            self.assertIsInstance(events[0][1], MidReset)
+            self.assertIsInstance(events[1][1], MidGetStatus)
+            self.assertEqual(reader.poll(), [])
+
+    def test_overrun_and_truncate(self):
+        with EventBusReader(self.bus.name) as reader:
+            for _ in range(6):
+                self.bus.pump(self.con, RESET)
+            self.assertEqual(len(reader.poll()), 4)
+            self.assertEqual(reader.dropped, 2)
+            self.bus.publish(0x01, b"\x01" + bytes(40))
+            self.assertEqual(reader.poll(), [])
+            self.assertEqual(reader.truncated, 1)
+
+    def test_invalid_record(self):
+        with EventBusReader(self.bus.name) as reader:
+            self.bus.pump(self.con, RESET)
+            self.bus.publish(0x00, b"\xfd\x00")
+            self.bus.publish(0x01, b"")
+            self.bus.pump(self.con, RESET)
+            events = reader.poll()
+            self.assertEqual([type(ev) for _, ev in events], [MidReset, MidReset])
+            self.assertEqual(reader.invalid, 2)
+
+    def test_poll_raw(self):
+        with EventBusReader(self.bus.name) as reader:
+            self.bus.publish(0x01, b"\x01" + bytes(40), ts=2.0)
+            for seq, ts, msg_id, length, view in reader.poll_raw():
+                self.assertEqual((seq, ts, msg_id, length), (1, 2.0, 1, 41))
+                self.assertEqual(view[0], 1)
+                self.assertEqual(len(view), 48 - 19)
+                view.release()
+
+    def test_commands(self):
+        with EventBusReader(self.bus.name, slot=0) as reader:
+            reader.send(GetStatus())
+            reader.send(DeleteUser(7))
+            reqs = self.bus.commands()
+            self.assertEqual([r.encode() for r in reqs], [GetStatus().encode(), DeleteUser(7).encode()])
+            self.assertEqual(self.bus.commands(), [])
+            with self.assertRaises(ValueError):
+                for _ in range(17):
+                    reader.send(GetStatus())
+        with EventBusReader(self.bus.name) as reader:
+            with self.assertRaises(ValueError):
+                reader.send(GetStatus())
+
+    def test_wait(self):
+        with EventBusReader(self.bus.name) as r1, EventBusReader(self.bus.name) as r2:
+            self.assertFalse(r1.wait(0.01))
+            self.assertFalse(r2.wait(0))
+            timer = threading.Timer(0.05, self.bus.pump, (self.con, RESET))
+            timer.start()
+            self.assertTrue(r1.wait(5))
+            timer.join()
+            self.assertTrue(r2.wait(0))
+            self.assertEqual(len(r1.poll()), 1)
+            self.assertFalse(r1.wait(0))
+            self.assertEqual(len(r2.poll()), 1)
+            with EventBusReader(self.bus.name) as r3:
+                r3.wait(0)
+                with EventBusReader(self.bus.name) as r4:
+                    r4.wait(0)
+                    with self.assertRaises(ValueError):
+                        with EventBusReader(self.bus.name) as r5:
+                            r5.wait(0)
+
+    def test_other_process(self):
+        self.bus.pump(self.con, RESET)
+        self.bus.publish(0x01, b"\x01" + bytes(16))
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_child, args=(self.bus.name, queue))
+        proc.start()
+        self.assertEqual(queue.get(timeout=30), ["MidReset", "NidFaceState"])
+        proc.join(30)
+        self.assertEqual(proc.exitcode, 0)
+        (req,) = self.bus.commands()
+        self.assertEqual(req.data, b"\x00\x03")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.connection import Connection
+from fm22x.note import NidFaceState
+from fm22x.request import DeleteUser, GetStatus, GetUserInfo, MidGetSN, Verify
+from fm22x.response import MidGetStatus, MidVerify, MsgResultCode, Status
+from fm22x.sim import VirtualDevice
+
+
+class TestVirtualDevice(TestCase):
+    def setUp(self):
+        self.con = Connection()
+
+    def exchange(self, dev: VirtualDevice, req) -> list:
+        return list(self.con.receive(dev.feed(self.con.send(req))))
+
+    def test_verify(self):
+        dev = VirtualDevice(users={7: "alice"}, face_notes=3, seed=1)
+        events = self.exchange(dev, Verify(False, 5))
+        self.assertEqual(len(events), 4)
+        self.assertTrue(all(isinstance(ev, NidFaceState) for ev in events[:3]))
+        self.assertIsInstance(events[3], MidVerify)
+        self.assertEqual(events[3].user_id, 7)
+        self.assertEqual(events[3].request.command, Verify.command)
+
+    def test_commands(self):
+        dev = VirtualDevice(users={7: "alice"})
+        (status,) = self.exchange(dev, GetStatus())
+        self.assertIsInstance(status, MidGetStatus)
+        self.assertEqual(status.status, Status.IDLE)
+        (info,) = self.exchange(dev, GetUserInfo(7))
+        self.assertEqual(info.user_name.rstrip("\x00"), "alice")
+        (deleted,) = self.exchange(dev, DeleteUser(7))
+        self.assertEqual(deleted.result, MsgResultCode.SUCCESS)
+        (verify,) = self.exchange(dev, Verify(False, 5))
+        self.assertEqual(verify.result, MsgResultCode.FAILED4_UNKNOWNUSER)
+        (sn,) = self.exchange(dev, MidGetSN())
+        self.assertEqual(sn.result, MsgResultCode.MR_REJECTED)
+
+    def test_split_and_garbage_request(self):
+        dev = VirtualDevice()
+        frame = GetStatus().encode()
+        self.assertEqual(dev.feed(b"\x00\x01" + frame[:3]), b"")
+        self.assertNotEqual(dev.feed(frame[3:]), b"")
+        self.assertEqual(dev.requests, 1)
+        broken = bytearray(frame)
+        broken[-1] ^= 0xFF
+        self.assertEqual(dev.feed(bytes(broken)), b"")
+        self.assertEqual(dev.errors, 1)
+
+    def test_noise(self):
+        dev = VirtualDevice(users={1: "a"}, face_notes=5, noise=0.5, corrupt=0.1, seed=3)
+        got = errors = 0
+        for _ in range(200):
+            data = dev.feed(self.con.send(Verify(False, 5)))
+            while True:
+                try:
+                    for _ in self.con.receive(data):
+                        got += 1
+                    break
+                except ValueError:
+                    errors += 1
+                    self.con.resync()
+                    data = b""
+        self.assertGreater(dev.noise_bytes, 0)
+        self.assertGreater(errors, 0)
+        # 被损坏的帧最多拖累一个相邻的帧
+        self.assertGreaterEqual(got, dev.frames - 2 * dev.corrupted - errors)
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
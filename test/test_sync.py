@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.request import DeleteUser, GetUserInfo, MidEnrollWithPhoto, MidGetAllUserid
+from fm22x.response import (
+    MidDelUser,
+    MidEnrollWithPhoto as MidEnrollWithPhotoResp,
+    MidGetAllUserID,
+    MidGetUserInfo,
+)
+from fm22x.photo import Preflight
+from fm22x.response import MsgResultCode
+from fm22x.sync import DesiredUser, Enrollment, FleetSync, SyncError, photo_digest
+from test_photo import jpeg
+
+
+class FakeDevice:
+    def __init__(self, users: dict):
+        self.users = dict(users)  # id -> (name, admin)
+        self.calls = []
+        self.enrolling = 0  # 正在照片注册的用户ID
+
+    async def call(self, req):
+        self.calls.append(req)
+        await asyncio.sleep(0)
+        if isinstance(req, MidGetAllUserid):
+            data = bytes([len(self.users)]) + b"".join(
+                i.to_bytes(2, "big") for i in self.users
+            )
+            return MidGetAllUserID(0x24, 0, data)
+        if isinstance(req, GetUserInfo):
+            name, admin = self.users[req.user_id]
+            return MidGetUserInfo(
+                0x22,
+                0,
+                req.user_id.to_bytes(2, "big")
+                + name.encode().ljust(32, b"\x00")
+                + bytes([admin]),
+            )
+        if isinstance(req, DeleteUser):
+            if self.users.pop(req.user_id, None) is None:
+                return MidDelUser(0x20, 8, b"")
+            return MidDelUser(0x20, 0, b"")
+        if isinstance(req, MidEnrollWithPhoto):
+            # 照片注册不带名字和管理员标志，第一包时分配用户ID
+            if req.data[:2] == b"\x00\x00":
+                self.enrolling = max(self.users, default=0) + 1
+                self.users[self.enrolling] = ("", False)
+            return MidEnrollWithPhotoResp(
+                0xF7, 0, req.data[:2] + self.enrolling.to_bytes(2, "big")
+            )
+        raise AssertionError(req)
+
+
+MANIFEST = [
+    DesiredUser(1, "alice", False, b"a" * 5000),
+    DesiredUser(2, "bob", True, b"b" * 100),
+    DesiredUser(3, "carol", False, b"c" * 100),
+]
+
+
+class TestSync(TestCase):
+    def test_plan_and_apply(self):
+        devices = {
+            "door1": FakeDevice({1: ("", False), 2: ("", False), 9: ("eve", False)}),
+            "door2": FakeDevice({}),
+        }
+        enrolled = {
+            "door1": {
+                1: Enrollment(1, photo_digest(MANIFEST[0].photo)),
+                2: Enrollment(2, photo_digest(b"old photo")),
+            }
+        }
+        sync = FleetSync(MANIFEST, concurrency=1, enrolled=enrolled)
+        report = asyncio.run(sync.run(devices, dry_run=True))
+        plan = report.devices["door1"].plan
+        self.assertEqual(sorted(plan.delete), [2, 9])
+        self.assertEqual([u.user_id for u in plan.enroll], [2, 3])
+        self.assertEqual(plan.keep, 1)
+        self.assertEqual(len(report.devices["door2"].plan.enroll), 3)
+        self.assertGreater(report.saved, 0)
+        self.assertFalse(
+            any(isinstance(c, DeleteUser) for c in devices["door1"].calls)
+        )
+
+        report = asyncio.run(sync.run(devices))
+        self.assertEqual(report.errors, {})
+        sent = devices["door1"].calls
+        self.assertEqual(
+            [c.user_id for c in sent if isinstance(c, DeleteUser)], [2, 9]
+        )
+        self.assertEqual(sum(isinstance(c, MidEnrollWithPhoto) for c in sent), 2)
+        self.assertIsNotNone(report.devices["door1"].elapsed)
+        self.assertEqual(
+            {k: e.device_id for k, e in sync.enrolled["door1"].items()},
+            {1: 1, 2: 2, 3: 3},
+        )
+        self.assertEqual(sorted(devices["door2"].users), [1, 2, 3])
+
+        # 照片注册不能设置名字和管理员标志，第二次同步不应再有任何操作
+        report = asyncio.run(sync.run(devices))
+        for name in devices:
+            self.assertFalse(report.devices[name].plan)
+            self.assertEqual(report.devices[name].plan.keep, 3)
+
+    def test_adopt_by_name(self):
+        # 没有注册记录时按名字和管理员标志认领，第一次同步不会全量重建
+        device = FakeDevice(
+            {4: ("alice", False), 5: ("bob", False), 6: ("carol", False), 7: ("", False)}
+        )
+        sync = FleetSync(MANIFEST)
+        report = asyncio.run(sync.run({"door": device}))
+        self.assertEqual(report.errors, {})
+        plan = report.devices["door"].plan
+        self.assertEqual(plan.adopt, {1: 4, 3: 6})
+        self.assertEqual(plan.keep, 2)
+        self.assertEqual(sorted(plan.delete), [5, 7])
+        self.assertEqual([u.user_id for u in plan.enroll], [2])
+        self.assertEqual(
+            sync.enrolled["door"][1], Enrollment(4, photo_digest(MANIFEST[0].photo))
+        )
+        report = asyncio.run(sync.run({"door": device}))
+        self.assertFalse(report.devices["door"].plan)
+        self.assertEqual(report.devices["door"].plan.keep, 3)
+
+    def test_error_isolated(self):
+        class Broken(FakeDevice):
+            async def call(self, req):
+                if isinstance(req, DeleteUser):
+                    return MidDelUser(0x20, 5, b"")
+                return await super().call(req)
+
+        devices = {
+            "bad": Broken({7: ("mallory", False)}),
+            "good": FakeDevice({}),
+        }
+        report = asyncio.run(FleetSync(MANIFEST).run(devices))
+        self.assertIsInstance(report.errors["bad"], SyncError)
+        self.assertNotIn("good", report.errors)
+        self.assertIn("error", report.summary())
+
+    def test_preflight(self):
+        manifest = [
+            DesiredUser(1, "alice", False, jpeg(640, 480, exif=500)),
+            DesiredUser(2, "bob", False, jpeg(4000, 3000)),
+            DesiredUser(3, "carol", True, jpeg(100, 100)),
+        ]
+        # bob 在设备上但照片已更新，新照片不合格时保持原样
+        device = FakeDevice({2: ("", False)})
+        enrolled = {"door": {2: Enrollment(2, photo_digest(b"old photo"))}}
+        sync = FleetSync(manifest, preflight=Preflight(), enrolled=enrolled)
+        report = asyncio.run(sync.run({"door": device}))
+        self.assertEqual(
+            report.rejected,
+            {
+                2: MsgResultCode.FAILED4_JPGPHOTO_LARGE,
+                3: MsgResultCode.FAILED4_JPGPHOTO_SMALL,
+            },
+        )
+        plan = report.devices["door"].plan
+        self.assertEqual(plan.delete, [])
+        self.assertEqual(sorted(plan.skipped), [2, 3])
+        (photo,) = [c for c in device.calls if isinstance(c, MidEnrollWithPhoto)]
+        self.assertEqual(photo.data[2:], jpeg(640, 480))
+        # 摘要沿用预检时对原照片的 sha256
+        self.assertEqual(sync.enrolled["door"][1].digest, photo_digest(manifest[0].photo))
+        self.assertIn("photo rejected", report.summary())
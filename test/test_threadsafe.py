@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import random
+import sys
+import threading
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.crypto import XorCipher
+from fm22x.note import NidFaceState
+from fm22x.request import GetStatus, GetUserInfo, Verify
+from fm22x.response import MidGetStatus, Response
+from fm22x.sim import VirtualDevice, encode_frame
+from fm22x.threadsafe import ThreadSafeConnection
+
+FACE = bytes.fromhex("01 0000 0064 0064 00c8 00c8 0000 0000 0000")
+STATUS = bytes.fromhex("11 00 00")
+
+
+class TestThreadSafe(TestCase):
+    def setUp(self):
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # 尽量多地在线程间切换
+
+    def tearDown(self):
+        sys.setswitchinterval(self.interval)
+
+    def test_receive(self):
+        con = ThreadSafeConnection()
+        dev = VirtualDevice(users={1: "a"}, face_notes=2)
+        events = list(con.receive(dev.feed(con.send(Verify(False, 5)))))
+        self.assertEqual(len(events), 3)
+        self.assertEqual(events[2].request.command, Verify.command)
+        self.assertEqual(con.pending, {})
+        with self.assertRaises(TimeoutError):
+            con.get(timeout=0.01)
+
+    def test_receive_frames(self):
+        con = ThreadSafeConnection()
+        con.send(GetStatus())
+        stream = encode_frame(0x00, STATUS) + encode_frame(0x01, FACE)
+        frames = []
+        for msg_id, payload in con.receive_frames(stream):
+            # 分帧在锁内，产出时不持有锁，同一线程里可以继续发送
+            self.assertFalse(con._lock.locked())
+            con.send(GetStatus())
+            frames.append((msg_id, bytes(payload)))
+        self.assertEqual(frames, [(0x00, STATUS), (0x01, FACE)])
+        self.assertEqual(len(con.pending[GetStatus.command]), 2)
+        self.assertEqual(con.buffer, b"")
+        t = threading.Thread(target=lambda: list(con.receive_frames(stream)))
+        with con._lock:
+            t.start()
+            t.join(0.05)
+            self.assertTrue(t.is_alive())  # 其他线程持有锁时等待
+        t.join()
+        self.assertEqual(len(con.pending[GetStatus.command]), 1)
+
+    def test_stress(self):
+        con = ThreadSafeConnection(XorCipher(b"0123456789abcdef"))
+        device = ThreadSafeConnection(XorCipher(b"0123456789abcdef", host=False))
+        notes, replies = 3000, 1000
+        frames = [encode_frame(0x01, FACE)] * notes
+        frames += [encode_frame(0x00, STATUS)] * replies
+        random.Random(0).shuffle(frames)
+        # 用同一个密钥的模组端加密，模拟模组发出的密文
+        stream = bytearray()
+        for frame in frames:
+            sealed = bytearray(frame)
+            device._seal(memoryview(sealed), 0, len(sealed))
+            stream += sealed
+        stream = bytes(stream)
+
+        got: list = []
+        errors: list = []
+        done = threading.Event()
+
+        def reader():
+            rnd = random.Random(1)
+            pos = 0
+            while pos < len(stream):
+                step = rnd.randint(1, 64)
+                con.feed(stream[pos : pos + step])
+                pos += step
+            done.set()
+
+        def worker():
+            try:
+                while not (done.is_set() and not con.frames):
+                    for ev in con.events(timeout=0.01):
+                        got.append(ev)
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        def sender():
+            for i in range(500):
+                con.send(GetUserInfo(i))
+                con.send(GetStatus())
+
+        threads = [threading.Thread(target=reader), threading.Thread(target=sender)]
+        threads += [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(got), notes + replies)
+        self.assertEqual(sum(isinstance(ev, NidFaceState) for ev in got), notes)
+        self.assertTrue(
+            all(isinstance(ev, MidGetStatus) for ev in got if isinstance(ev, Response))
+        )
+        self.assertEqual(con.buffer, b"")
+        self.assertIn(GetUserInfo.command, con.pending)
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
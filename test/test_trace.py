@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.connection import Connection
+from fm22x.request import DeleteUser
+from fm22x.trace import Tracer
+
+RESPONSE = bytes.fromhex("EF AA 00 00 02 20 00 22")
+NOTE = bytes.fromhex("EF AA 01 00 01 00 00")
+
+
+class TestTrace(TestCase):
+    def setUp(self):
+        ticks = itertools.count()
+        self.tracer = Tracer(clock=lambda: next(ticks) / 1000, pid=1)
+        self.con = Connection()
+        self.con.tracer = self.tracer
+
+    def test_transaction(self):
+        self.con.send(DeleteUser(1))
+        list(self.con.receive(RESPONSE[:3]))
+        list(self.con.receive(RESPONSE[3:] + NOTE))
+        trace = [ev for ev in self.tracer.chrome_trace()["traceEvents"] if ev["ph"] == "X"]
+        names = [ev["name"] for ev in trace]
+        self.assertEqual(
+            names,
+            [
+                "encode DELETE_USER",
+                "receive MidDelUser",
+                "frame MidDelUser",
+                "decode MidDelUser",
+                "device MidDelUser",
+                "MID_DELUSER",
+                "receive NidReady",
+                "frame NidReady",
+                "decode NidReady",
+            ],
+        )
+        self.assertGreater(trace[1]["dur"], 0)  # first byte before last byte
+        self.assertEqual(trace[5]["args"], {"result": "SUCCESS"})
+        self.assertEqual(trace[5]["ts"], trace[0]["ts"])
+
+    def test_pipelined(self):
+        self.con.send_many([DeleteUser(1), DeleteUser(2)])
+        list(self.con.receive(RESPONSE * 2))
+        trace = self.tracer.chrome_trace()["traceEvents"]
+        encode = [ev["ts"] for ev in trace if ev["name"] == "encode DELETE_USER"]
+        transaction = [ev["ts"] for ev in trace if ev["name"] == "MID_DELUSER"]
+        self.assertEqual(len(encode), 2)
+        self.assertEqual(transaction, encode)
+
+    def test_cancelled_request(self):
+        stale = DeleteUser(1)
+        self.con.send(stale)
+        self.con.cancel(stale)
+        self.con.send(DeleteUser(2))
+        list(self.con.receive(RESPONSE))
+        trace = self.tracer.chrome_trace()["traceEvents"]
+        encode = [ev["ts"] for ev in trace if ev["name"] == "encode DELETE_USER"]
+        transaction = [ev["ts"] for ev in trace if ev["name"] == "MID_DELUSER"]
+        self.assertEqual(transaction, encode[1:])
+
+    def test_dump(self):
+        self.con.send(DeleteUser(1))
+        with self.tracer.span("write"):
+            pass
+        list(self.con.receive(RESPONSE))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            self.tracer.dump(path)
+            with open(path, encoding="utf-8") as f:
+                trace = json.load(f)
+        complete = [ev for ev in trace["traceEvents"] if ev["ph"] == "X"]
+        self.assertEqual(len(complete), 7)
+        self.assertTrue(all(ev["dur"] >= 0 for ev in complete))
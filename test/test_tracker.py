@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.note import FaceState, NidFaceState, NidReady
+from fm22x.tracker import FaceTracker
+from helpers import face
+
+
+class TestTracker(TestCase):
+    def setUp(self):
+        self.tracker = FaceTracker(window=4)
+
+    def test_only_changes(self):
+        notes = [
+            face(FaceState.NORMAL, 100, 100),
+            face(FaceState.NORMAL, 101, 100),
+            NidReady(0, b""),
+            face(FaceState.TOOLEFT, 10, 100),
+            face(FaceState.TOOLEFT, 12, 100),
+            face(FaceState.NORMAL, 100, 100),
+        ]
+        self.assertEqual(
+            list(self.tracker.track(notes)),
+            [FaceState.NORMAL, FaceState.TOOLEFT, FaceState.NORMAL],
+        )
+
+    def test_smoothing(self):
+        for i in range(6):
+            self.tracker.feed(face(FaceState.NORMAL, 100 + 10 * i, 50, yaw=-5), i)
+        # window holds i = 2..5
+        self.assertEqual(self.tracker.position, (185.0, 100.0))
+        self.assertEqual(self.tracker.pose, (-5.0, 0.0, 0.0))
+        vx, vy = self.tracker.velocity
+        self.assertAlmostEqual(vx, 10.0)
+        self.assertAlmostEqual(vy, 0.0)
+        self.assertLess(self.tracker.stability, 1.0)
+
+    def test_noface_clears(self):
+        self.tracker.feed(face(FaceState.NORMAL, 100, 100), 0)
+        self.tracker.feed(face(FaceState.NORMAL, 100, 100), 1)
+        self.assertEqual(self.tracker.stability, 1.0)
+        self.assertEqual(self.tracker.feed(face(FaceState.NOFACE, 0, 0), 2), FaceState.NOFACE)
+        self.assertEqual(self.tracker.velocity, (0.0, 0.0))
+
+    def test_short_and_unknown_notes(self):
+        self.assertIsNone(self.tracker.feed(NidFaceState(1, b"\x00\x00\x00"), 0))
+        self.assertIsNone(self.tracker.state)
+        unknown = NidFaceState(1, b"\x00\x63" + face(FaceState.NORMAL, 100, 100).data[2:])
+        self.assertEqual(unknown.state, FaceState.UNKNOW_STATUS)
+        self.assertEqual(self.tracker.feed(unknown, 1), FaceState.UNKNOW_STATUS)
+        self.assertEqual(self.tracker.position, (150.0, 150.0))
+
+    def test_signed_pose(self):
+        note = face(FaceState.NORMAL, 100, 100, yaw=-5)
+        self.assertEqual((note.yaw, note.pitch, note.roll), (-5, 0, 0))
+        self.assertEqual(note.face.right, 200)
+        with self.assertRaises(ValueError):
+            NidFaceState(1, b"\x00\x00").yaw
+
+    def test_noface_discards_window(self):
+        self.tracker.feed(face(FaceState.NORMAL, 0, 0), 0)
+        self.tracker.feed(face(FaceState.NORMAL, 0, 0), 1)
+        self.tracker.feed(face(FaceState.NOFACE, 0, 0), 2)
+        self.tracker.feed(face(FaceState.NORMAL, 500, 500), 3)
+        self.assertEqual(self.tracker.position, (550.0, 550.0))
+        self.assertEqual(self.tracker.velocity, (0.0, 0.0))
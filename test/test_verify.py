@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import sys
+
+sys.path.append(".")
+from unittest import TestCase
+
+from fm22x.metrics import LatencyHistogram
+from fm22x.note import FaceState, NidReady
+from fm22x.request import Verify
+from fm22x.response import MidVerify, MsgResultCode
+from fm22x.verify import LoopState, VerifyLoop
+from helpers import face
+
+
+def result(code: MsgResultCode = MsgResultCode.SUCCESS) -> MidVerify:
+    if code == MsgResultCode.SUCCESS:
+        return MidVerify(0x12, code, b"\x00\x01" + bytes(32) + b"\x00\x01")
+    return MidVerify(0x12, code, b"")
+
+
+class TestHistogram(TestCase):
+    def test_percentiles(self):
+        h = LatencyHistogram()
+        for i in range(1, 1001):
+            h.record(i / 1000)
+        self.assertAlmostEqual(h.p50, 0.5, delta=0.5 * 0.02)
+        self.assertAlmostEqual(h.p99, 0.99, delta=0.99 * 0.02)
+        other = LatencyHistogram()
+        other.record(5.0)
+        h.merge(other)
+        self.assertEqual(h.count, 1001)
+        self.assertEqual(h.percentile(100), 5.0)
+
+    def test_empty_summary(self):
+        self.assertEqual(LatencyHistogram().summary(), "n=0")
+
+
+class TestVerifyLoop(TestCase):
+    def test_rearm_and_latency(self):
+        loop = VerifyLoop(timeout=3)
+        (req,) = loop.start()
+        self.assertIsInstance(req, Verify)
+        loop.feed(face(FaceState.NOFACE), now=0.0)
+        loop.feed(face(), now=1.0)
+        loop.feed(face(), now=1.1)
+        self.assertEqual(loop.feed(result(), now=1.25), [req])
+        loop.feed(face(), now=2.0)
+        self.assertEqual(loop.feed(result(MsgResultCode.FAILED4_TIMEOUT), now=2.5), [req])
+        self.assertEqual(loop.latency.count, 2)
+        self.assertEqual(loop.unlock_latency.count, 1)
+        self.assertAlmostEqual(loop.unlock_latency.p50, 0.25, delta=0.01)
+
+    def test_backoff(self):
+        loop = VerifyLoop(backoff=1.0)
+        loop.start()
+        self.assertEqual(loop.feed(result(MsgResultCode.FAILED4_CAMERA), now=10.0), [])
+        self.assertEqual(loop.resume_at, 11.0)
+        self.assertEqual(loop.poll(now=10.5), [])
+        self.assertEqual(len(loop.poll(now=11.0)), 1)
+        loop.feed(result(MsgResultCode.MR_REJECTED), now=12.0)
+        self.assertEqual(loop.resume_at, 14.0)
+        loop.poll(now=14.0)
+        self.assertEqual(len(loop.feed(result(MsgResultCode.FAILED4_TIMEOUT), now=20.0)), 1)
+        loop.feed(result(MsgResultCode.FAILED4_CAMERA), now=30.0)
+        self.assertEqual(loop.resume_at, 31.0)
+
+    def test_backoff_capped(self):
+        loop = VerifyLoop(backoff=1.0, max_backoff=30.0)
+        loop.start()
+        for _ in range(2000):  # 2**1024 overflows a float
+            loop.feed(result(MsgResultCode.FAILED4_CAMERA), now=0.0)
+            self.assertLessEqual(loop.resume_at, 30.0)
+            loop.poll(now=loop.resume_at)
+        loop.feed(result(MsgResultCode.FAILED4_CAMERA), now=0.0)
+        self.assertEqual(loop.resume_at, 30.0)
+
+    def test_lost_result(self):
+        loop = VerifyLoop(timeout=3, margin=1.0)
+        (req,) = loop.start(now=10.0)
+        self.assertEqual(loop.deadline, 14.0)
+        self.assertEqual(loop.poll(now=13.9), [])
+        self.assertEqual(loop.poll(now=14.0), [req])
+        self.assertEqual((loop.lost, loop.deadline), (1, 18.0))
+        loop.feed(result(MsgResultCode.FAILED4_TIMEOUT), now=15.0)
+        self.assertEqual(loop.deadline, 19.0)
+        loop.feed(result(MsgResultCode.FAILED4_CAMERA), now=16.0)
+        self.assertIsNone(loop.deadline)
+        self.assertEqual(loop.poll(now=100.0), [req])
+
+    def test_pd_rightaway(self):
+        loop = VerifyLoop(pd_rightaway=True)
+        loop.start()
+        self.assertEqual(loop.feed(result(), now=1.0), [])
+        self.assertEqual(loop.state, LoopState.powered_down)
+        self.assertEqual(len(loop.feed(NidReady(0, b""), now=2.0)), 1)
+        self.assertEqual(loop.state, LoopState.armed)